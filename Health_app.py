@@ -1,27 +1,68 @@
+import time
+
+# Each script run is timed from here to the end of the page
+rerun_started = time.perf_counter()
+rerun_cpu_started = time.thread_time()
+
+# Load environment variables first: project modules read their NUTRIGENIE_* settings at import
+# (GOOGLE_API_KEY is read when the first Gemini model is created)
 from dotenv import load_dotenv
+load_dotenv()
 
 import streamlit as st
 st.set_page_config(page_title="NutriGenie", layout="wide", page_icon="🍎")
 
-import os
-import google.generativeai as genai
-from google.api_core.exceptions import ResourceExhausted, GoogleAPIError, InvalidArgument
-from PIL import Image
-import sqlite3
-import io
-from database import save_search, delete_search, get_previous_searches, init_db
-from auth import login_page, registration_page, get_cookie, set_cookie
+from database import save_search, init_db, log_meal, get_daily_intake, get_weekly_intake
+from nutrition import parse_nutrition, MealRecord, FoodItem
+from foods import get_food_index
+import metabolism
+from prompts import render_prompt, prompt_title
+from history import (load_history, load_more, get_response, record_search, forget_search, clear_history,
+                     find_searches, HISTORY_FEATURES)
+from imaging import preprocess_image
+from gemini import is_failure, HEAVY_HEDGE_DELAY
+from image_dedup import meal_index
+from shopping import build_shopping_list, learn_recipes, recipe_ingredients_prompt, unseen_recipes
+from recipes import RecipeRequest, recipe_store
+from scheduler import Scheduler
+from jobs import JobManager, JobLimitError, JOB_POLL_SECONDS
+from auth import login_page, registration_page, restore_session, end_session
+from sessions import session_store
+from maintenance import start_maintenance
 from datetime import datetime, timedelta
-import time, random
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-# Intialize database
-init_db()
+import uuid
+import metrics
+from admin import admin_tab, is_admin
+
+metrics.set_feature(None)
+
+# One scheduler per process: every session shares the Gemini quota and the queue
+@st.cache_resource
+def get_scheduler():
+    return Scheduler()
+
+# One-time process setup; reruns and new sessions reuse it
+@st.cache_resource(show_spinner=False)
+def startup():
+    steps = {}
+
+    def step(name, func):
+        started = time.perf_counter()
+        func()
+        steps[name] = time.perf_counter() - started
+        metrics.record("startup", name, steps[name])
+
+    # Intialize database
+    step("init_db", init_db)
+    # Drop login sessions that expired while the app was down
+    step("purge_sessions", session_store.purge_expired)
+    # Pre-generate popular RecipeMaster requests while the app is idle, within the shared quota
+    step("start_prewarm", lambda: recipe_store.start_prewarm(scheduler=get_scheduler()))
+    # Retention, archival and vacuum of users.db on a schedule (only if NUTRIGENIE_MAINTENANCE_HOURS is set)
+    step("start_maintenance", start_maintenance)
+    return steps
+
+startup()
 
 # Function to get Gemini API response
 # def get_gemini_response(input_prompt, image=None):
@@ -34,102 +75,199 @@ init_db()
 #         return response.text
 #     except Exception as e:
 #         return f"Error: {e}"
-# Define models in priority order
-GEMINI_MODELS = [
-    "models/gemini-2.0-flash",
-    "models/gemini-2.0-flash-lite",
-    "models/gemini-1.5-pro",
-    "models/gemini-1.5-flash"
-]
-
-def get_gemini_response(prompt: str, image_data=None): 
-    for model_name in GEMINI_MODELS:
-        try:
-            print(f"Trying model: {model_name}")
-            model = genai.GenerativeModel(model_name=model_name)
-            
-            # Check if image data is provided
-            if image_data:
-                response = model.generate_content([prompt, image_data[0]])
-            else:
-                response = model.generate_content(prompt)
-            
-            if hasattr(response, 'text') and response.text.strip():
-                return {
-                    "model_used": model_name,
-                    "response": response.text.strip()
-                }
-        except ResourceExhausted:
-            print(f"[Quota Exhausted] - {model_name}")
-        except InvalidArgument as e:
-            print(f"[Invalid Argument] - {model_name}: {e}")
-        except GoogleAPIError as e:
-            print(f"[API Error] - {model_name}: {e}")
-        except Exception as e:
-            print(f"[Unknown Error] - {model_name}: {e}")
-
-    # If none worked
-    return {
-        "model_used": None,
-        "response": "🚫 All Gemini models failed due to quota or configuration issues. Please try again later."
+
+# Record how long this script run took
+def record_rerun(name):
+    metrics.record("rerun", name, time.perf_counter() - rerun_started,
+                   cpu_ms=round((time.thread_time() - rerun_cpu_started) * 1000, 2))
+
+# One job manager per process: Gemini calls run in the background and outlive reruns
+@st.cache_resource
+def get_jobs():
+    return JobManager(get_scheduler())
+
+# Jobs belong to the logged-in user, or to this browser session before login
+def job_user():
+    if "queue_id" not in st.session_state:
+        st.session_state["queue_id"] = uuid.uuid4().hex
+    return st.session_state.get("user_id") or st.session_state["queue_id"]
+
+# Start the Gemini call for a feature; `context` comes back from finished_job
+def start_job(feature, prompt, image_data=None, hedge_delay=None, **context):
+    try:
+        job = get_jobs().submit(job_user(), prompt, image_data, hedge_delay)
+    except JobLimitError as e:
+        st.warning(f"⏳ {e}")
+        return
+    st.session_state.setdefault("jobs", {})[feature] = {"id": job.id, "context": context}
+
+# Poll a running job: place in line or the answer so far, and a cancel button
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(feature, show_text=True):
+    entry = st.session_state.get("jobs", {}).get(feature)
+    job = get_jobs().get(entry["id"]) if entry else None
+    if job is None or job.finished:
+        st.rerun()  # the full run renders the result
+    if job.status == "queued" and job.queue_position:
+        st.info(f"⏳ You're #{job.queue_position} in line — starting in about {job.eta:.0f}s")
+    elif job.chunks and show_text:
+        st.write(job.text)
+    else:
+        st.info("✨ Generating your answer...")
+    if st.button("✖️ Cancel", key=f"cancel_job_{feature.lower()}"):
+        get_jobs().cancel(job.id, job_user())
+        del st.session_state["jobs"][feature]
+        st.rerun()
+
+# Show a feature's job; returns (answer, context) on the run where it finished, else ("", {})
+# show_text=False is for jobs whose raw answer is only input for the page, not for the user
+def finished_job(feature, ready_message=None, show_text=True):
+    entry = st.session_state.get("jobs", {}).get(feature)
+    if not entry:
+        return "", {}
+    job = get_jobs().get(entry["id"])
+    if job is not None and not job.finished:
+        job_progress(feature, show_text)
+        return "", {}
+    del st.session_state["jobs"][feature]
+    if job is None or job.status == "cancelled":
+        return "", {}
+    if job.status == "failed":
+        st.error(job.error)
+        return "", {}
+    if show_text:
+        st.write(job.text)
+    if ready_message:
+        st.success(ready_message)
+    return job.text, entry["context"]
+
+# Log parsed meal totals so intake can be tracked over time
+def log_parsed_meal(meal):
+    if meal:
+        log_meal(st.session_state["user_id"], meal)
+        st.caption(f"📒 Logged {meal.calories:.0f} kcal to your nutrition log.")
+
+# Page header and intro, shared by the Home page and the app
+HEADER_HTML = """
+<style>
+    /* Responsive Container */
+    .responsive-container {
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+        justify-content: center;
+        text-align: center;
+    }
+    .responsive-container h1 {
+        font-size: 2.5rem;
+        margin-top: 20px;
     }
 
-def health():
-    st.warning("!!    Login to keep track of your history and to explore our other more advanced features   !!")
-    st.markdown(
-    """
-    <style>
-        /* Responsive Container */
-        .responsive-container {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            text-align: center;
-        }
+    /* Ensures all text and headings in tabs stay in one line on smaller screens */
+    .tab-content, .tab-content h1, .tab-content h2, .tab-content p, .tab-content span {
+        white-space: nowrap; /* Prevent text wrapping */
+        overflow: hidden; /* Hide overflow if necessary */
+        text-overflow: ellipsis; /* Adds ellipsis (...) for overflowing text */
+    }
+
+    /* Media Queries for responsiveness */
+    @media (max-width: 768px) {
         .responsive-container h1 {
-            font-size: 2.5rem;
-            margin-top: 20px;
+            font-size: 2rem;  /* Adjust font size for tablets */
         }
-
-        /* Ensures all text and headings in tabs stay in one line on smaller screens */
-        .tab-content, .tab-content h1, .tab-content h2, .tab-content p, .tab-content span {
-            white-space: nowrap; /* Prevent text wrapping */
-            overflow: hidden; /* Hide overflow if necessary */
-            text-overflow: ellipsis; /* Adds ellipsis (...) for overflowing text */
+        .tab-content, .tab-content h1, .tab-content h2, .tab-content p {
+            font-size: 1rem; /* Adjust font size for smaller screens */
         }
+    }
 
-        /* Media Queries for responsiveness */
-        @media (max-width: 768px) {
-            .responsive-container h1 {
-                font-size: 2rem;  /* Adjust font size for tablets */
-            }
-            .tab-content, .tab-content h1, .tab-content h2, .tab-content p {
-                font-size: 1rem; /* Adjust font size for smaller screens */
-            }
+    @media (max-width: 480px) {
+        .responsive-container h1 {
+            font-size: 1.5rem; /* Adjust font size for mobile devices */
         }
-
-        @media (max-width: 480px) {
-            .responsive-container h1 {
-                font-size: 1.5rem; /* Adjust font size for mobile devices */
-            }
-            .tab-content, .tab-content h1, .tab-content h2, .tab-content p {
-                font-size: 0.9rem; /* Smaller font size for very small screens */
-            }
+        .tab-content, .tab-content h1, .tab-content h2, .tab-content p {
+            font-size: 0.9rem; /* Smaller font size for very small screens */
         }
-    </style>
-    <div class="responsive-container">
-        <h1>🍎 NutriGenie 🥗</h1>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
-
+    }
+</style>
+<div class="responsive-container">
+    <h1>🍎 NutriGenie 🥗</h1>
+</div>
+"""
+
+def show_header():
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
     st.markdown(
-    '<p class="info"><br>Welcome to your personalized <strong>AI-powered health assistant!</strong> '
-    'Get detailed dietary and lifestyle recommendations based on your health concerns.</p>',
-    unsafe_allow_html=True,
-)
+        '<p class="info"><br>Welcome to your personalized <strong>AI-powered health assistant!</strong> '
+        'Get detailed dietary and lifestyle recommendations based on your health concerns.</p>',
+        unsafe_allow_html=True,
+    )
+
+# Decode, orient and shrink a meal photo once per distinct upload (reruns reuse the result)
+@st.cache_data(max_entries=16, show_spinner=False)
+def prepare_meal_image(raw):
+    return preprocess_image(raw)
+
+# Nutrition table for foods matched in the local food database
+def show_food_macros(matches):
+    st.table([
+        {"Food": food.name, "Serving": food.serving, "Calories": food.calories,
+         "Protein (g)": food.protein, "Carbs (g)": food.carbs, "Fats (g)": food.fats}
+        for food in matches
+    ])
+
+# Save a templated search: only the template id, its inputs and a short title are stored
+def save_feature_search(feature, template_id, inputs, response):
+    record_search(st.session_state, st.session_state["user_id"], feature,
+                  prompt_title(template_id, inputs), response, template_id, inputs)
+
+# Shopping list from the stored recipe map; Gemini writes the list when no recipe is known
+def show_shopping_list(inputs, learned=()):
+    shopping_list = build_shopping_list(inputs["planned_recipes"], inputs["available_ingredients"], learned)
+    if shopping_list.resolved:
+        shopping_list_response = shopping_list.to_markdown()
+        st.markdown(shopping_list_response)
+        st.success("✅ *Your Smart Shopping List is Ready!*")
+        save_feature_search("SmartShopper", "smartshopper", inputs, shopping_list_response)
+    else:
+        start_job("SmartShopper", render_prompt("smartshopper", **inputs), inputs=inputs)
+
+# Sidebar history for one feature: titles from the session cache, responses loaded when opened
+def show_history(feature, header, label, title_length, suffix=""):
+    page = load_history(st.session_state, st.session_state["user_id"])[feature]
+    if page["entries"]:
+        st.sidebar.header(header)
+        for search_id, title, timestamp in page["entries"]:
+            with st.sidebar.expander(f"{label}{title[:title_length]}{suffix}"):
+                if st.toggle("Show response", key=f"show_{feature.lower()}_{search_id}"):
+                    st.write(get_response(st.session_state, search_id))
+                if st.button("🗑️ Delete", key=f"delete_{feature.lower()}_{search_id}"):
+                    forget_search(st.session_state, feature, search_id)
+                    st.rerun()
+        if page["has_more"] and st.sidebar.button("Load more", key=f"more_{feature.lower()}"):
+            load_more(st.session_state, st.session_state["user_id"], feature)
+            st.rerun()
+
+# Sidebar search over every saved answer, best matches first
+def show_history_search():
+    text = st.sidebar.text_input("🔎 Search your history", key="history_search",
+                                 placeholder="e.g., diabetes breakfast")
+    if not text.strip():
+        return
+    features = st.sidebar.multiselect("Only in:", HISTORY_FEATURES, key="history_search_features")
+    results = find_searches(st.session_state["user_id"], text, features)
+    if not results:
+        st.sidebar.caption("No matching searches.")
+    for search_id, feature, title, snippet, timestamp in results:
+        with st.sidebar.expander(f"{feature}: {title}"):
+            st.markdown(snippet)
+            st.caption(timestamp)
+            if st.toggle("Show response", key=f"show_match_{search_id}"):
+                st.write(get_response(st.session_state, search_id))
+
+def health():
+    metrics.set_feature("NutriGenie")
+    st.warning("!!    Login to keep track of your history and to explore our other more advanced features   !!")
+    show_header()
 
 
     st.header("Your Health Companion")
@@ -143,26 +281,16 @@ def health():
        if not user_query.strip():  # Ensures it's not just spaces
             st.error("Please enter a health problem")
        else:
-            prompt = f"""
-            You are a certified nutritionist. A user has the following health problem: {user_query}.
-            Provide detailed recommendations, including:
-            1. Foods to eat.
-            2. Foods to avoid.
-            3. Lifestyle and exercise tips.
-            """
-            response = get_gemini_response(prompt)
-            st.success("🎉 **Your Recommendations Are Ready!**")
-            st.write(response["response"])
-            if st.session_state["logged_in"]:
-                save_search(st.session_state["user_id"], user_query, response["response"])
-            else:
-                st.write("")
+            prompt = render_prompt("nutrigenie", user_query=user_query)
+            start_job("Home", prompt, user_query=user_query)
+
+    response, context = finished_job("Home", ready_message="🎉 **Your Recommendations Are Ready!**")
+    if response and st.session_state["logged_in"]:
+        save_search(st.session_state["user_id"], context["user_query"], response)
 
-# Read login state from cookies
+# Read login state from the session cookie (once per browser session)
 if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = get_cookie("logged_in") == "True"
-    st.session_state["user_id"] = get_cookie("user_id") or None
-    st.session_state["username"] = get_cookie("username") or ""
+    restore_session()
 
 
 
@@ -181,15 +309,12 @@ if not st.session_state["logged_in"]:
 else:
     st.sidebar.write(f"👤 Welcome, {st.session_state['username']}!")
     if st.sidebar.button("Logout"):
-        st.session_state["logged_in"] = False
-        st.session_state["user_id"] = None
-        st.session_state["username"] = ""
-
-        # Clear Cookies on Logout
-        set_cookie("logged_in", "False")
-        set_cookie("user_id", "")
-        set_cookie("username", "")
+        for entry in st.session_state.pop("jobs", {}).values():
+            get_jobs().cancel(entry["id"], job_user())
+        # Revoke the server-side session and clear the cookie
+        end_session()
 
+        clear_history(st.session_state)
         st.cache_data.clear()  # Clear Streamlit cache
         st.rerun()
 
@@ -203,68 +328,21 @@ if not st.session_state["logged_in"]:
         registration_page()
     elif page == "Login":
         login_page()
-    
-    st.stop()
-
-st.markdown(
-    """
-    <style>
-        /* Responsive Container */
-        .responsive-container {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            text-align: center;
-        }
-        .responsive-container h1 {
-            font-size: 2.5rem;
-            margin-top: 20px;
-        }
 
-        /* Ensures all text and headings in tabs stay in one line on smaller screens */
-        .tab-content, .tab-content h1, .tab-content h2, .tab-content p, .tab-content span {
-            white-space: nowrap; /* Prevent text wrapping */
-            overflow: hidden; /* Hide overflow if necessary */
-            text-overflow: ellipsis; /* Adds ellipsis (...) for overflowing text */
-        }
-
-        /* Media Queries for responsiveness */
-        @media (max-width: 768px) {
-            .responsive-container h1 {
-                font-size: 2rem;  /* Adjust font size for tablets */
-            }
-            .tab-content, .tab-content h1, .tab-content h2, .tab-content p {
-                font-size: 1rem; /* Adjust font size for smaller screens */
-            }
-        }
-
-        @media (max-width: 480px) {
-            .responsive-container h1 {
-                font-size: 1.5rem; /* Adjust font size for mobile devices */
-            }
-            .tab-content, .tab-content h1, .tab-content h2, .tab-content p {
-                font-size: 0.9rem; /* Smaller font size for very small screens */
-            }
-        }
-    </style>
-    
-    <div class="responsive-container">
-        <h1>🍎 NutriGenie 🥗</h1>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
+    record_rerun("logged_out")
+    st.stop()
 
-st.markdown(
-    '<p class="info"><br>Welcome to your personalized <strong>AI-powered health assistant!</strong> '
-    'Get detailed dietary and lifestyle recommendations based on your health concerns.</p>',
-    unsafe_allow_html=True,
-)
+show_header()
 
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["NutriGenie", "AI-Calorie Tracker", " MetaboTrack", "RecipeMaster", "SmartShopper"])
+tab_names = ["NutriGenie", "AI-Calorie Tracker", " MetaboTrack", "RecipeMaster", "SmartShopper"]
+show_admin = is_admin(st.session_state["username"])
+if show_admin:
+    tab_names.append("Admin")
+tabs = st.tabs(tab_names)
+tab1, tab2, tab3, tab4, tab5 = tabs[:5]
 with tab1:
+    metrics.set_feature("NutriGenie")
     st.header("Your Health Companion")
     col1, col2 = st.columns([9, 1])
 
@@ -276,36 +354,22 @@ with tab1:
        if not user_query.strip():  # Ensures it's not just spaces
             st.error("Please enter a health problem")
        else:
-            prompt = f"""
-            You are a certified nutritionist. A user has the following health problem: {user_query}.
-            Provide detailed recommendations, including:
-            1. Foods to eat.
-            2. Foods to avoid.
-            3. Lifestyle and exercise tips.
-            """
-            response = get_gemini_response(prompt)
-            st.success("🎉 **Your Recommendations Are Ready!**")
-            st.write(response["response"])
-            if st.session_state["logged_in"]:
-                save_search(st.session_state["user_id"], "Nutrigenie", user_query, response["response"])
-            else:
-                st.sidebar.warning("Please Login!")
+            prompt = render_prompt("nutrigenie", user_query=user_query)
+            start_job("Nutrigenie", prompt, inputs={"user_query": user_query})
+
+    response, context = finished_job("Nutrigenie", ready_message="🎉 **Your Recommendations Are Ready!**")
+    if response and not is_failure(response):
+        save_feature_search("Nutrigenie", "nutrigenie", context["inputs"], response)
 
     if st.session_state["logged_in"]:
-        previous_searches = get_previous_searches(st.session_state["user_id"], "Nutrigenie")
         st.sidebar.title("📁Previous Searches")
-        if previous_searches:
-            st.sidebar.header("📁NutriGenie")
-            for search_id, user_query, response in previous_searches:
-                with st.sidebar.expander(f"NutriGenie:  {user_query[:20]}"):
-                    st.write(response)
-                    if st.button("🗑️ Delete", key=f"delete_nutrigenie_{search_id}"):
-                        delete_search(search_id)
-                        st.rerun()
+        show_history_search()
+        show_history("Nutrigenie", "📁NutriGenie", "NutriGenie:  ", 20)
 
 # Tab 2: Calorie Tracker with AI - Total Calories
 if st.session_state["logged_in"]:
    with tab2:
+    metrics.set_feature("Calorie")
     st.header("Track Calories, Stay Healthy")
     # Drag and Drop File Section
     st.markdown("### Upload Your Meal Image")
@@ -323,61 +387,93 @@ if st.session_state["logged_in"]:
         if st.button("Close Camera"):
             enable_camera = False  # Reset the checkbox (simulated close behavior)
 
-    # Display uploaded or captured image
+    # Display uploaded or captured image (the same prepared image is sent to Gemini)
     image = None
     if uploaded_file is not None:
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Uploaded Image", use_column_width=True)
+        image = prepare_meal_image(uploaded_file.getvalue())
+        st.image(image.image, caption="Uploaded Image", use_column_width=True)
     elif camera_input is not None:
-        image = Image.open(camera_input)
-        st.image(image, caption="Captured Image", use_column_width=True)
+        image = prepare_meal_image(camera_input.getvalue())
+        st.image(image.image, caption="Captured Image", use_column_width=True)
+    if image:
+        st.caption(image.summary())
 
     # Analyze Image
     if st.button("Calculate calories"):
         if image:
             try:
                 # Process the image as binary data for the Gemini API
-                image_data = [{"mime_type": "image/jpeg", "data": camera_input.getvalue() if camera_input else uploaded_file.getvalue()}]
-                input_prompt = """
-                You are an expert nutritionist. Analyze the image to identify the food items 
-                and calculate the total calories. Provide the result in the following format:
-                Calories
-                1. Item 1 - no. of calories
-                2. Item 2 - no. of calories
-                ----
-
-                Protein
-                1.Item 1 - no. of protein
-                2.Item 2 - no. of protein
-                ----
-
-                Carbs
-                1.Item 1 - no. of carbs
-                2.Item 2 - no. of carbs
-                ----
-
-                Fats
-                1.Item 1 - no. of fats
-                2.Item 2 - no. of fats
-                ----
-
-                1.Total Calories: XX
-                2.Total Protein: XX
-                3.Total Carbs: XX
-                4.Total Fats: XX
-                """
-
-                response = get_gemini_response(input_prompt, image_data)
+                image_data = image.as_image_data()
+                input_prompt = render_prompt("calorie")
+
                 st.subheader("Analysis Result:")
-                st.write(response["response"])
+                # Re-uploads and near-identical re-shots reuse the earlier analysis
+                match = meal_index.lookup(image.image)
+                if match:
+                    response = match[0]
+                    st.caption("♻️ Matched a previous analysis of a near-identical photo.")
+                    st.write(response)
+                    log_parsed_meal(parse_nutrition(response))
+                else:
+                    start_job("Calorie", input_prompt, image_data, hedge_delay=HEAVY_HEDGE_DELAY, image=image.image)
             except Exception as e:
                 st.error(f"Error: {e}")
         else:
             st.error("Please upload or capture an image to analyze.")
 
+    response, context = finished_job("Calorie")
+    if response and not is_failure(response):
+        meal_index.add(context["image"], response)
+        log_parsed_meal(parse_nutrition(response))
+
+    # Quick text lookup: common single foods are answered from the local food table
+    st.markdown("### Or Look Up a Single Food")
+    food_query = st.text_input("Type a food (e.g., banana, boiled egg):", key="food_lookup")
+    if st.button("Look up") and food_query.strip():
+        food = get_food_index().match(food_query)
+        st.session_state["lookup_food"] = food
+        st.session_state["lookup_meal"] = None
+        if food:
+            st.session_state["lookup_meal"] = MealRecord(
+                food.calories, food.protein, food.carbs, food.fats,
+                [FoodItem(food.name, food.calories, food.protein, food.carbs, food.fats)])
+        else:
+            start_job("CalorieLookup", render_prompt("calorie_text", food=food_query))
+
+    response, _ = finished_job("CalorieLookup")
+    if response and not is_failure(response):
+        st.session_state["lookup_meal"] = parse_nutrition(response)
+
+    # A lookup is only a lookup: the meal is logged when the user says so
+    if st.session_state.get("lookup_food"):
+        show_food_macros([st.session_state["lookup_food"]])
+    lookup_meal = st.session_state.get("lookup_meal")
+    if lookup_meal and st.button(f"📒 Log this ({lookup_meal.calories:.0f} kcal)", key="log_lookup"):
+        log_parsed_meal(lookup_meal)
+        st.session_state["lookup_food"] = st.session_state["lookup_meal"] = None
+
+    # Intake over time from the nutrition log
+    st.markdown("### Your Intake")
+    daily = get_daily_intake(st.session_state["user_id"], days=30)
+    if daily:
+        st.line_chart({
+            "Day": [row[0] for row in daily],
+            "Calories": [row[1] for row in daily],
+            "7-day average": [row[6] for row in daily],
+        }, x="Day")
+        with st.expander("Weekly totals"):
+            st.table([
+                {"Week": week, "Calories": calories, "Protein (g)": protein, "Carbs (g)": carbs,
+                 "Fats (g)": fats, "Avg calories / day": average}
+                for week, calories, protein, carbs, fats, average in get_weekly_intake(st.session_state["user_id"])
+            ])
+    else:
+        st.info("Analyze a meal to start your nutrition log.")
+
 # Tab 3: Calorie Needs by Age
 if st.session_state["logged_in"]:
     with tab3:
+        metrics.set_feature("MetaboTrack")
         st.header("⚡ MetaboTrack - AI Metabolic Health Analyzer")
 
         # User Inputs
@@ -404,54 +500,47 @@ if st.session_state["logged_in"]:
         # Combine date and time to form a full datetime object
         last_meal_datetime = datetime.combine(st.session_state["meal_date"], st.session_state["last_meal_time"])
 
+        fast_mode = st.checkbox("⚡ Fast mode (score only, skip AI advice)")
+
         if st.button("🔍 Analyze My Metabolism"):
             # Ensure the selected time is valid (past time)
             current_time = datetime.now()
             if last_meal_datetime > current_time:
                 st.error("The last meal time cannot be in the future! Please select a valid time.")
             else:
-                # Generate input prompt for Gemini API
-                prompt = f"""
-                You are a highly advanced AI metabolism tracker.
-                A user wants to optimize their metabolism and improve health.
-                Analyze the user's data and provide personalized suggestions.
-
-                User Information:
-                - Activity Level: {activity_level}
-                - Sleep Duration: {sleep_hours} hours
-                - Last Meal Time: {last_meal_datetime.strftime('%Y-%m-%d %H:%M:%S')}
-
-                Your Analysis Should Include:
-                1. Metabolism Score (0-100) based on their inputs.
-                2. Identify if the user is in Fat Storage Mode, Balanced Metabolism, or Fat Burning Mode.
-                3. Best time for the user to eat, exercise, and rest for optimal metabolism.
-                4. Personalized advice to improve metabolic health.
-                """
-
-                # Call Gemini API to get response
-                response = get_gemini_response(prompt)
-                
-                st.success("🎉 **Your AI-Powered Metabolism Analysis is Ready!**")
-                st.write(response["response"])
-                if st.session_state["logged_in"]:
-                   save_search(st.session_state["user_id"], "MetaboTrack", prompt, response["response"])
+                # Score locally: same inputs always give the same score and state
+                result = metabolism.analyze(activity_level, sleep_hours, last_meal_datetime, current_time)
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Metabolism Score", f"{result.score}/100")
+                col2.metric("State", result.fasting_state)
+                col3.metric("Hours Since Last Meal", result.hours_since_meal)
+
+                metabo_inputs = {
+                    "activity_level": activity_level,
+                    "sleep_hours": sleep_hours,
+                    "hours_since_meal": round(result.hours_since_meal),
+                    "score": result.score,
+                    "fasting_state": result.fasting_state,
+                }
+                if fast_mode:
+                    save_feature_search("MetaboTrack", "metabotrack_advice", metabo_inputs, metabolism.summary(result))
                 else:
-                    st.sidebar.warning("Please Login!")
+                    # Gemini only writes the narrative advice around the local score
+                    prompt = render_prompt("metabotrack_advice", **metabo_inputs)
+                    start_job("MetaboTrack", prompt, inputs=metabo_inputs, summary=metabolism.summary(result))
+
+        advice, context = finished_job("MetaboTrack", ready_message="🎉 **Your AI-Powered Metabolism Analysis is Ready!**")
+        if advice and not is_failure(advice):
+            save_feature_search("MetaboTrack", "metabotrack_advice", context["inputs"],
+                                context["summary"] + "\n\n" + advice)
 
         if st.session_state["logged_in"]:
-            previous_searches = get_previous_searches(st.session_state["user_id"], "MetaboTrack")
-            if previous_searches:
-                st.sidebar.header("📁Metabotrack")
-                for search_id, user_query, response in previous_searches:
-                    with st.sidebar.expander(f"Metabotrack: {user_query[:30]}"):
-                        st.write(response)
-                        if st.button("🗑️ Delete", key=f"delete_metabotrack_{search_id}"):
-                            delete_search(search_id)
-                            st.rerun()
+            show_history("MetaboTrack", "📁Metabotrack", "Metabotrack: ", 30)
 
 # Tab 4: Recipe Suggestions
 if st.session_state["logged_in"]:
    with tab4:
+    metrics.set_feature("RecipeMaster")
     st.header("RecipeMaster - Personalized Recipe Suggestions 🍳")
     st.markdown("### Get customized recipes based on your preferences, goals, and ingredients!")
 
@@ -483,47 +572,50 @@ if st.session_state["logged_in"]:
             st.error("Please enter at least one ingredient.")
         else:
             # Generate a prompt for recipe suggestions
-            recipe_prompt = f"""
-            You are a master chef and nutritionist. Based on the following inputs:
-            - Dietary Preference: {dietary_preferences}
-            - Health Goal: {health_goal}
-            - Ingredients: {ingredients}
-
-            Suggest 3 healthy and delicious recipes. For each recipe, include:
-            1. Recipe name
-            2. Brief description
-            3. Ingredients list
-            4. Step-by-step cooking instructions
-            5. Nutritional information (calories, protein, carbs, fats)
-            """
-
-            # Fetch recipe suggestions using Gemini API
-            recipe_response = get_gemini_response(recipe_prompt)
-
-            # Display the Response
-            st.success("🎉 *Your Recipe Suggestions Are Ready!*")
-            if recipe_response:
-                st.write(recipe_response["response"])
-                if st.session_state["logged_in"]:
-                   save_search(st.session_state["user_id"], "RecipeMaster" , recipe_prompt, recipe_response["response"])
-                else:
-                    st.sidebar.warning("Please Login!")
+            recipe_inputs = {
+                "dietary_preferences": dietary_preferences,
+                "health_goal": health_goal,
+                "ingredients": ingredients,
+            }
+            # Same preference, goal and ingredient set (in any order or spelling) share one answer
+            recipe_request = RecipeRequest.from_inputs(dietary_preferences, health_goal, ingredients)
+
+            # Instant macros for the ingredients the local food table knows
+            food_index = get_food_index()
+            matched = [food_index.match(name) for name in ingredients.split(",") if name.strip()]
+            matched = [food for food in matched if food]
+            if matched:
+                with st.expander("🥗 Nutrition of your ingredients (per typical serving)", expanded=False):
+                    show_food_macros(matched)
+
+            match = recipe_store.lookup(recipe_request)
+            if match:
+                recipe_response = match.response
+                if match.kind == "superset":
+                    st.caption(f"♻️ Reusing earlier suggestions; they also call for: {', '.join(match.missing)}.")
+                elif match.kind == "subset":
+                    st.caption("♻️ Reusing earlier suggestions made from a subset of your ingredients.")
+                st.write(recipe_response)
+                st.success("🎉 *Your Recipe Suggestions Are Ready!*")
+                save_feature_search("RecipeMaster", "recipemaster", recipe_inputs, recipe_response)
             else:
-                st.error("Unable to fetch recipes. Please try again.")
+                # Ask Gemini in the background; the answer is shown once the job finishes
+                prompt_inputs = recipe_request.prompt_inputs() if recipe_request.ingredients else recipe_inputs
+                recipe_prompt = render_prompt("recipemaster", **prompt_inputs)
+                start_job("RecipeMaster", recipe_prompt, hedge_delay=HEAVY_HEDGE_DELAY,
+                          request=recipe_request, inputs=recipe_inputs)
+
+    recipe_response, context = finished_job("RecipeMaster", ready_message="🎉 *Your Recipe Suggestions Are Ready!*")
+    if recipe_response and not is_failure(recipe_response):
+        recipe_store.add(context["request"], recipe_response)
+        save_feature_search("RecipeMaster", "recipemaster", context["inputs"], recipe_response)
 
     if st.session_state["logged_in"]:
-        previous_searches = get_previous_searches(st.session_state["user_id"], "RecipeMaster")
-        if previous_searches:
-            st.sidebar.header("📁RecipeMaster")
-            for search_id, user_query, response in previous_searches:
-                with st.sidebar.expander(f"RecipeMaster: {user_query[:20]}..."):
-                    st.write(response)
-                    if st.button("🗑️ Delete", key=f"delete_recipemaster_{search_id}"):
-                        delete_search(search_id)
-                        st.rerun()
+        show_history("RecipeMaster", "📁RecipeMaster", "RecipeMaster: ", 20, "...")
 
 if st.session_state["logged_in"]:
    with tab5:
+    metrics.set_feature("SmartShopper")
     st.header("SmartShopper - AI-Generated Shopping List 🛒")
     st.markdown("### Create a smart shopping list based on your planned meals!")
 
@@ -551,36 +643,32 @@ if st.session_state["logged_in"]:
             st.error("Please enter the ingredients you have at home.")
         else:
             # Generate a prompt for shopping list creation
-            shopping_list_prompt = f"""
-            You are a kitchen assistant. Based on the following inputs:
-            - Planned Recipes: {planned_recipes}
-            - Ingredients at Home: {available_ingredients}
-
-            Create a smart shopping list by identifying the missing ingredients needed to make the planned recipes.
-            Categorize the ingredients into sections (e.g., Vegetables, Spices, Dairy, etc.) for easy shopping.
-            """
-
-            # Fetch shopping list using Gemini API
-            shopping_list_response = get_gemini_response(shopping_list_prompt)
-
-            # Display the Shopping List
-            st.success("✅ *Your Smart Shopping List is Ready!*")
-            if shopping_list_response:
-                st.write(shopping_list_response["response"])
-                if st.session_state["logged_in"]:
-                    save_search(st.session_state["user_id"], "SmartShopper", shopping_list_prompt, shopping_list_response["response"])
-                else:
-                   st.sidebar.warning("Please Login!")
+            shopping_inputs = {
+                "planned_recipes": planned_recipes,
+                "available_ingredients": available_ingredients,
+            }
+            # Known recipes are diffed locally; only new recipes cost a (background) Gemini call
+            unseen = unseen_recipes(planned_recipes)
+            if unseen:
+                start_job("SmartShopperRecipes", recipe_ingredients_prompt(unseen), inputs=shopping_inputs,
+                          recipes=unseen)
             else:
-                st.error("Unable to generate shopping list. Please try again.")
+                show_shopping_list(shopping_inputs)
+
+    # New recipes learned: the list is built once their ingredients are stored
+    recipes_response, context = finished_job("SmartShopperRecipes", show_text=False)
+    if context:
+        show_shopping_list(context["inputs"], learn_recipes(context["recipes"], recipes_response))
+
+    shopping_list_response, context = finished_job("SmartShopper", ready_message="✅ *Your Smart Shopping List is Ready!*")
+    if shopping_list_response and not is_failure(shopping_list_response):
+        save_feature_search("SmartShopper", "smartshopper", context["inputs"], shopping_list_response)
 
     if st.session_state["logged_in"]:
-        previous_searches = get_previous_searches(st.session_state["user_id"], "SmartShopper")
-        if previous_searches:
-            st.sidebar.header("📁SmartShopper")
-            for search_id, user_query, response in previous_searches:
-                with st.sidebar.expander(f"SmartShopper: {user_query[:30]}..."):
-                    st.write(response)
-                    if st.button("🗑️ Delete", key=f"delete_smartshopper_{search_id}"):
-                        delete_search(search_id)
-                        st.rerun()
\ No newline at end of file
+        show_history("SmartShopper", "📁SmartShopper", "SmartShopper: ", 30, "...")
+
+if show_admin:
+    with tabs[5]:
+        admin_tab(jobs=get_jobs(), scheduler=get_scheduler())
+
+record_rerun("app")
@@ -0,0 +1,98 @@
+import os
+import time
+
+import streamlit as st
+
+import metrics
+import response_cache
+from gemini import registry
+from image_dedup import meal_index
+from recipes import recipe_store
+from sessions import session_store
+
+# Usernames allowed to see the Admin tab (comma-separated)
+ADMIN_USERS = {name.strip() for name in os.getenv("NUTRIGENIE_ADMINS", "").split(",") if name.strip()}
+
+WINDOWS = {"Last 15 minutes": 15 * 60, "Last hour": 60 * 60, "Last 24 hours": 24 * 60 * 60, "Last 7 days": 7 * 24 * 60 * 60}
+
+
+def is_admin(username):
+    return bool(username) and username in ADMIN_USERS
+
+
+def _table(title, rows):
+    st.markdown(f"**{title}**")
+    if rows:
+        st.table(rows)
+    else:
+        st.caption("No data yet.")
+
+
+def _rate(value):
+    return f"{value:.0%}" if value is not None else "–"
+
+
+# Live state of this process's caches, models and queues
+def runtime_state(jobs=None, scheduler=None):
+    st.subheader("Runtime state")
+    for title, stats in [("Gemini response cache", response_cache.stats()), ("Meal photo index", meal_index.stats()),
+                         ("Recipe store", recipe_store.stats()), ("Login sessions", session_store.stats())]:
+        if "hit_rate" in stats:
+            stats["hit_rate"] = _rate(stats["hit_rate"])
+        _table(title, [stats])
+    _table("Gemini models", [dict(row, success_rate=_rate(row["success_rate"]),
+                                  avg_latency=round(row["avg_latency"], 2) if row["avg_latency"] is not None else None,
+                                  failures=", ".join(f"{kind}: {count}" for kind, count in row["failures"].items()))
+                             for row in registry.snapshot()])
+    if jobs is not None:
+        _table("Background jobs", [jobs.stats()])
+    if scheduler is not None:
+        snapshot = scheduler.snapshot()
+        tokens = snapshot.pop("tokens")
+        _table("Scheduler", [snapshot])
+        _table("Scheduler tokens", [{"model": name, "available": available} for name, available in tokens.items()])
+
+
+# Admin Tab
+def admin_tab(jobs=None, scheduler=None):
+    st.header("Admin - Performance Metrics 📈")
+    col1, col2 = st.columns(2)
+    window = col1.selectbox("Time window:", list(WINDOWS), index=1)
+    stored = col2.checkbox("Include flushed history (metrics table)", value=False,
+                           help="Without this only this process's in-memory ring buffer is used.")
+    since = time.time() - WINDOWS[window]
+
+    if stored:
+        metrics.flush()
+        events = metrics.load_events(since)
+    else:
+        events = metrics.events(since=since)
+
+    llm = [e for e in events if e.kind == "llm"]
+    calls = [e for e in llm if e.outcome != "cache_hit"]
+    hits = len(llm) - len(calls)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Gemini attempts", len(calls))
+    col2.metric("Cache hit rate", f"{hits / len(llm):.0%}" if llm else "–")
+    col3.metric("Avg fallback depth", f"{sum(e.attrs.get('depth', 0) for e in calls) / len(calls):.2f}" if calls else "–")
+
+    _table("Gemini latency by feature", metrics.summarize(calls, lambda e: e.feature or "(none)"))
+    _table("Gemini latency by model", metrics.summarize(calls, lambda e: e.name))
+    _table("Database calls", metrics.summarize([e for e in events if e.kind == "db"], lambda e: e.name))
+    _table("Password hashing", metrics.summarize([e for e in events if e.kind == "hash"], lambda e: e.name))
+    reruns = [e for e in events if e.kind == "rerun"]
+    rerun_rows = metrics.summarize(reruns, lambda e: e.name)
+    for row in rerun_rows:
+        cpu = [e.attrs["cpu_ms"] for e in reruns if e.name == row["group"] and "cpu_ms" in e.attrs]
+        row["cpu_p50_ms"] = metrics.percentile(cpu, 0.5) if cpu else None
+    _table("Script reruns", rerun_rows)
+    _table("Process startup", [{"step": e.name, "ms": round(e.latency * 1000, 1),
+                                "at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.ts))}
+                               for e in events if e.kind == "startup"])
+
+    runtime_state(jobs, scheduler)
+
+    with st.expander("Prometheus export"):
+        text = metrics.prometheus(events)
+        st.code(text, language="text")
+        st.download_button("Download metrics.prom", text, file_name="metrics.prom", mime="text/plain")
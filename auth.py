@@ -1,6 +1,10 @@
 import streamlit as st
 import extra_streamlit_components as stx
 from database import register_user, login_user
+from sessions import session_store
+
+# The only login cookie: an opaque signed session token
+SESSION_COOKIE = "session"
 
 # Initialize Cookie Manager
 def get_manager():
@@ -16,6 +20,21 @@ def set_cookie(key, value):
 def get_cookie(key):
     return cookie_manager.get(key)
 
+# Restore the login for a new browser session from the session cookie
+def restore_session():
+    user = session_store.resolve(get_cookie(SESSION_COOKIE))
+    st.session_state["logged_in"] = user is not None
+    st.session_state["user_id"] = user["id"] if user else None
+    st.session_state["username"] = user["username"] if user else ""
+
+# End the server-side session and forget the cookie
+def end_session():
+    session_store.revoke(get_cookie(SESSION_COOKIE))
+    set_cookie(SESSION_COOKIE, "")
+    st.session_state["logged_in"] = False
+    st.session_state["user_id"] = None
+    st.session_state["username"] = ""
+
 def registration_page():
     st.subheader("Create an Account")
     username = st.text_input("Enter Username")
@@ -42,11 +61,8 @@ def login_page():
             st.session_state["username"] = user["username"]
             st.session_state["logged_in"] = True
 
-            # Store login session in cookies
-            set_cookie("logged_in", "True")
-            set_cookie("user_id", str(user["id"]))  # Convert to string for cookies
-            set_cookie("username", user["username"])
-
+            # Store only a signed session token in the cookie
+            set_cookie(SESSION_COOKIE, session_store.create(user["id"], user["username"]))
 
             st.success(f"Welcome {user['username']}!")
             st.rerun()
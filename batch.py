@@ -0,0 +1,175 @@
+"""Headless batch runner for the NutriGenie prompt templates.
+
+Reads JSONL requests, answers them on a bounded thread pool through the same
+templates and model fallback as the app, and appends one NDJSON result per
+request as soon as it finishes. Each input line is an object such as
+
+    {"id": "r1", "template": "recipemaster", "inputs": {"dietary_preferences": "Vegan", ...}}
+    {"feature": "RecipeMaster", "inputs": {...}}
+    {"template": "calorie", "image": "photos/lunch.jpg"}
+    {"prompt": "free-form prompt text"}
+
+Results carry the 1-based input line number. With --resume, lines that already
+have a successful result in the output file are skipped, so an interrupted run
+picks up where it stopped.
+
+    python batch.py requests.jsonl -o results.ndjson --workers 8 --rpm 15 --resume
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+# Before the project imports, which read their NUTRIGENIE_* settings at import time
+load_dotenv()
+
+from database import init_db
+from gemini import RateLimiter, get_gemini_response, is_failure
+from prompts import FEATURE_TEMPLATES, render_prompt
+
+# Batch settings (override through environment variables or flags)
+BATCH_WORKERS = int(os.getenv("NUTRIGENIE_BATCH_WORKERS", 8))
+BATCH_RPM = int(os.getenv("NUTRIGENIE_BATCH_RPM", 15))
+
+
+def read_requests(path, skip=()):
+    """Yields (line_number, request) lazily, leaving out blank and skipped lines."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if line.strip() and number not in skip:
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, {"error": f"invalid JSON: {e}"}
+
+
+def completed_lines(path):
+    """Line numbers with a successful result in an existing output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partial last line from an interrupted run
+            if record.get("ok"):
+                done.add(record["line"])
+    return done
+
+
+def build_prompt(request):
+    """Returns (template_id, prompt, image_data) for one input request."""
+    if "error" in request:
+        raise ValueError(request["error"])
+    if "prompt" in request:
+        return None, request["prompt"], None
+    template_id = request.get("template") or FEATURE_TEMPLATES.get(request.get("feature"))
+    if not template_id:
+        raise ValueError("request needs a 'template', a known 'feature' or a 'prompt'")
+    try:
+        prompt = render_prompt(template_id, **request.get("inputs", {}))
+    except KeyError as e:
+        raise ValueError(f"missing input {e} for template '{template_id}'")
+    image_data = None
+    if request.get("image"):
+        from imaging import preprocess_image
+        with open(request["image"], "rb") as f:
+            image_data = preprocess_image(f.read()).as_image_data()
+    return template_id, prompt, image_data
+
+
+def run_one(number, request, rate_limiter, use_cache):
+    started = time.time()
+    record = {"line": number, "id": request.get("id"), "template": None, "ok": False}
+    try:
+        record["template"], prompt, image_data = build_prompt(request)
+        result = get_gemini_response(prompt, image_data, use_cache=use_cache, rate_limiter=rate_limiter)
+        record["model_used"] = result["model_used"]
+        record["response"] = result["response"]
+        record["ok"] = not is_failure(result["response"])
+    except Exception as e:
+        record["error"] = str(e)
+    record["elapsed"] = round(time.time() - started, 3)
+    return record
+
+
+def run(input_path, output_path, workers=BATCH_WORKERS, rpm=BATCH_RPM, model_rpm=None, resume=False,
+        use_cache=True):
+    """Processes the whole input file; returns counts of ok and failed requests."""
+    skip = completed_lines(output_path) if resume else set()
+    if skip:
+        print(f"[Batch] - resuming, {len(skip)} lines already done")
+    rate_limiter = RateLimiter(rpm, model_rpm)
+    counts = {"ok": 0, "failed": 0, "skipped": len(skip)}
+    write_lock = threading.Lock()
+    started = time.time()
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+
+        def write(record):
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["ok" if record["ok"] else "failed"] += 1
+                done = counts["ok"] + counts["failed"]
+                if done % 50 == 0:
+                    print(f"[Batch] - {done} done in {time.time() - started:.0f}s")
+
+        # Keep at most two requests per worker in flight so huge inputs never sit in memory
+        pending = set()
+        for number, request in read_requests(input_path, skip):
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+            pending.add(pool.submit(run_one, number, request, rate_limiter, use_cache))
+        for future in wait(pending).done:
+            write(future.result())
+
+    counts["elapsed"] = round(time.time() - started, 1)
+    return counts
+
+
+def _model_rpm(values):
+    overrides = {}
+    for value in values or []:
+        name, _, budget = value.rpartition("=")
+        if not name:
+            raise ValueError(f"expected MODEL=RPM, got '{value}'")
+        overrides[name] = int(budget)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file with one request per line")
+    parser.add_argument("-o", "--output", default="results.ndjson")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--rpm", type=int, default=BATCH_RPM, help="requests per minute per model")
+    parser.add_argument("--model-rpm", action="append", metavar="MODEL=RPM",
+                        help="budget for one model, e.g. models/gemini-1.5-pro=2 (repeatable)")
+    parser.add_argument("--resume", action="store_true", help="skip lines already answered in the output")
+    parser.add_argument("--no-cache", action="store_true", help="always ask Gemini (refreshes the cache)")
+    args = parser.parse_args()
+    try:
+        model_rpm = _model_rpm(args.model_rpm)
+    except ValueError as e:
+        parser.error(str(e))
+
+    init_db()
+    counts = run(args.input, args.output, args.workers, args.rpm, model_rpm,
+                 args.resume, not args.no_cache)
+    print(json.dumps(counts, indent=2))
+    return 0 if counts["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Concurrency benchmark for database.py.
+
+Runs N writer and M reader threads against a throwaway database and reports
+operations per second, with the pooled WAL connection layer and with the old
+connect-per-call pattern for comparison.
+
+    python -m benchmarks.bench_db --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+
+FEATURES = ["Nutrigenie", "MetaboTrack", "RecipeMaster", "SmartShopper"]
+
+
+def _naive_save(path, user_id, feature, query, response):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO searches (user_id, feature, query, response) VALUES (?, ?, ?, ?)",
+                 (user_id, feature, query, response))
+    conn.commit()
+    conn.close()
+
+
+def _naive_read(path, user_id, feature):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT id, query, response FROM searches WHERE user_id=? AND feature=? "
+                        "ORDER BY timestamp DESC LIMIT 10", (user_id, feature)).fetchall()
+    conn.close()
+    return rows
+
+
+def run(writers=4, readers=8, seconds=5.0, users=50, mode="pooled"):
+    """Returns throughput and error counts for one benchmark configuration."""
+    path = os.path.join(tempfile.mkdtemp(prefix="nutrigenie-bench-"), "bench.db")
+    database.configure_db(path)
+    database.init_db()
+    if mode == "naive":
+        # The old code never enabled WAL, so reset the journal mode for a fair baseline
+        database.configure_db(path)
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+    response = "x" * 2000
+
+    def writer(n):
+        i = 0
+        while not stop.is_set():
+            feature = FEATURES[i % len(FEATURES)]
+            try:
+                if mode == "naive":
+                    _naive_save(path, i % users, feature, f"query {n}-{i}", response)
+                else:
+                    database.save_search(i % users, feature, f"query {n}-{i}", response)
+                key = "writes"
+            except sqlite3.OperationalError:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+            i += 1
+
+    def reader(n):
+        i = 0
+        while not stop.is_set():
+            feature = FEATURES[i % len(FEATURES)]
+            try:
+                if mode == "naive":
+                    _naive_read(path, (n + i) % users, feature)
+                else:
+                    database.get_previous_searches((n + i) % users, feature)
+                key = "reads"
+            except sqlite3.OperationalError:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+            i += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    database.configure_db(database.DB_PATH)
+
+    return {
+        "mode": mode,
+        "writers": writers,
+        "readers": readers,
+        "seconds": round(elapsed, 2),
+        "writes_per_sec": round(counts["writes"] / elapsed, 1),
+        "reads_per_sec": round(counts["reads"] / elapsed, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+    for mode in ("naive", "pooled"):
+        print(json.dumps(run(args.writers, args.readers, args.seconds, args.users, mode)))
+
+
+if __name__ == "__main__":
+    main()
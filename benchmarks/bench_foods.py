@@ -0,0 +1,77 @@
+"""Food lookup benchmark over a synthetic 100k-entry table.
+
+Expands the bundled foods with preparation/brand variants, builds the trigram
+index and times exact, misspelt and unmatched queries.
+
+    python -m benchmarks.bench_foods --foods 100000 --queries 2000
+"""
+import argparse
+import json
+import random
+import time
+
+from foods import Food, FoodIndex, load_foods
+
+MODIFIERS = ["raw", "boiled", "grilled", "baked", "fried", "steamed", "organic", "homemade",
+             "frozen", "canned", "roasted", "low fat", "spicy", "sweet", "smoked", "fresh"]
+BRANDS = ["acme", "golden", "farmhouse", "sunrise", "valley", "prime", "harvest", "nature"]
+
+
+def synthetic_foods(count, seed=0):
+    rng = random.Random(seed)
+    base = load_foods()
+    foods = list(base)
+    while len(foods) < count:
+        food = rng.choice(base)
+        name = f"{rng.choice(BRANDS)} {rng.choice(MODIFIERS)} {food.name} {rng.randrange(1000)}"
+        foods.append(Food(name, food.serving, food.calories, food.protein, food.carbs, food.fats))
+    return foods
+
+
+def _typo(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + name[i + 1:]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(food_count=100_000, queries=2000, seed=0):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    index = FoodIndex(synthetic_foods(food_count, seed))
+    build_seconds = time.perf_counter() - started
+
+    names = [food.name for food in load_foods()]
+    workloads = {
+        "exact": [rng.choice(names) for _ in range(queries)],
+        "typo": [_typo(rng.choice(names), rng) for _ in range(queries)],
+        "unmatched": [f"zq{rng.randrange(10**6)}x" for _ in range(queries)],
+    }
+    results = {"foods": len(index), "build_seconds": round(build_seconds, 3)}
+    for label, workload in workloads.items():
+        timings = []
+        for query in workload:
+            started = time.perf_counter()
+            index.match(query)
+            timings.append((time.perf_counter() - started) * 1e6)
+        results[label] = {
+            "mean_us": round(sum(timings) / len(timings), 1),
+            "p50_us": round(_percentile(timings, 50), 1),
+            "p99_us": round(_percentile(timings, 99), 1),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foods", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.foods, args.queries), indent=2))
+
+
+if __name__ == "__main__":
+    main()
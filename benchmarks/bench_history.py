@@ -0,0 +1,100 @@
+"""History lookup benchmark over a large synthetic searches table.
+
+Builds a pre-migration users.db (baseline schema, no indexes), upgrades it with
+init_db(), then grows the history in steps and times get_previous_searches
+against the same query forced to skip the index.
+
+    python -m benchmarks.bench_history --rows 1000000 --users 1000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import database
+
+FEATURES = ["Nutrigenie", "MetaboTrack", "RecipeMaster", "SmartShopper"]
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, "
+    "email TEXT UNIQUE, password TEXT)",
+    "CREATE TABLE searches (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, feature TEXT, "
+    "query TEXT, response TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, "
+    "FOREIGN KEY(user_id) REFERENCES users(id))",
+]
+
+
+def _fill(path, start, stop, users):
+    conn = sqlite3.connect(path)
+    base = time.time() - 365 * 24 * 3600
+    rows = (
+        (i % users, FEATURES[i % len(FEATURES)], f"query {i}", "response text " * 20,
+         time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(base + i * 10)))
+        for i in range(start, stop)
+    )
+    conn.executemany("INSERT INTO searches (user_id, feature, query, response, timestamp) "
+                     "VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _time_lookups(fn, users, samples):
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for _ in range(samples):
+        fn(rng.randrange(users), rng.choice(FEATURES))
+    return (time.perf_counter() - started) / samples * 1000
+
+
+def run(rows=1_000_000, users=1000, steps=4, samples=200):
+    path = os.path.join(tempfile.mkdtemp(prefix="nutrigenie-bench-"), "users.db")
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+    database.configure_db(path)
+    database.init_db()
+    scan = sqlite3.connect(path)
+    with database.get_connection() as conn:
+        query_plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id, query, response FROM searches WHERE user_id=? AND feature=? "
+            "ORDER BY timestamp DESC LIMIT 10", (1, FEATURES[0])).fetchall()
+
+    def unindexed(user_id, feature):
+        return scan.execute("SELECT id, query, response FROM searches NOT INDEXED WHERE user_id=? "
+                            "AND feature=? ORDER BY timestamp DESC LIMIT 10", (user_id, feature)).fetchall()
+
+    results = []
+    filled = 0
+    for step in range(1, steps + 1):
+        target = rows * step // steps
+        _fill(path, filled, target, users)
+        filled = target
+        results.append({
+            "rows": filled,
+            "indexed_ms": round(_time_lookups(database.get_previous_searches, users, samples), 4),
+            "unindexed_ms": round(_time_lookups(unindexed, users, max(samples // 20, 5)), 4),
+        })
+    scan.close()
+    database.configure_db(database.DB_PATH)
+    return {"schema_version": database.SCHEMA_VERSION,
+            "query_plan": [row[-1] for row in query_plan],
+            "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.users, args.steps), indent=2))
+
+
+if __name__ == "__main__":
+    main()
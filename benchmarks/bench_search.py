@@ -0,0 +1,134 @@
+"""History search benchmark: FTS5 index against a naive LIKE scan.
+
+Fills a throwaway users.db with synthetic searches (packed responses plus
+their search index rows, as save_search() writes them), then times
+search_history() and the LIKE query it replaces for the same random one- and
+two-word searches.
+
+    python -m benchmarks.bench_search --rows 200000 --users 20
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import database
+import metrics
+
+FEATURES = ["Nutrigenie", "MetaboTrack", "RecipeMaster", "SmartShopper"]
+
+VOCABULARY = (
+    "diabetes insulin glucose breakfast lunch dinner snack protein fiber carbs fats calories oats quinoa "
+    "lentils chickpeas spinach kale broccoli salmon tuna chicken turkey tofu tempeh eggs yogurt almonds "
+    "walnuts avocado olive oil garlic ginger turmeric cinnamon berries banana apple orange lemon tomato "
+    "cucumber pepper onion rice pasta bread soup salad curry stew smoothie hydration sleep exercise "
+    "walking cholesterol pressure heart thyroid immunity gut skin stamina weight loss muscle gain keto "
+    "vegan vegetarian mediterranean gluten dairy sugar sodium potassium magnesium iron calcium vitamin"
+).split()
+FILLER = "the a and with for of to in your each day more less eat try add avoid keep choose".split()
+RARE_WORDS = 5000   # synthetic dish and ingredient names, so the vocabulary has a long tail like real answers
+
+
+def _vocabulary(rng, skew=1.0):
+    """Words and cumulative Zipf-like weights: a few words are everywhere, most are rare."""
+    words = VOCABULARY + [f"{rng.choice(VOCABULARY)[:4]}{i}" for i in range(RARE_WORDS)]
+    return words, list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(len(words))))
+
+
+def _text(rng, vocabulary, cum_weights, words):
+    picked = rng.choices(vocabulary, cum_weights=cum_weights, k=words)
+    return " ".join(word if rng.random() < 0.5 else rng.choice(FILLER) for word in picked)
+
+
+def _fill(path, rows, users, seed=0):
+    rng = random.Random(seed)
+    vocabulary, cum_weights = _vocabulary(rng)
+    conn = sqlite3.connect(path)
+    batch = []
+    for i in range(rows):
+        batch.append((i + 1, i % users, FEATURES[i % len(FEATURES)], _text(rng, vocabulary, cum_weights, 6),
+                      _text(rng, vocabulary, cum_weights, 120)))
+        if len(batch) == 5000 or i == rows - 1:
+            conn.executemany("INSERT INTO searches (id, user_id, feature, query, response) VALUES (?, ?, ?, ?, ?)",
+                             [row[:4] + (database.pack_text(row[4]),) for row in batch])
+            conn.executemany("INSERT INTO searches_fts(rowid, query, response) VALUES (?, ?, ?)",
+                             [(row[0], row[3], row[4]) for row in batch])
+            conn.commit()
+            batch = []
+    conn.close()
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+    }
+
+
+def run(rows=200_000, users=20, samples=100):
+    path = os.path.join(tempfile.mkdtemp(prefix="nutrigenie-bench-"), "users.db")
+    metrics.FLUSH_INTERVAL = 0  # keep benchmark events out of the metrics table
+    database.configure_db(path)
+    database.init_db()
+    started = time.perf_counter()
+    _fill(path, rows, users)
+    fill_seconds = time.perf_counter() - started
+
+    scan = sqlite3.connect(path)
+    scan.create_function("unpack_text", 1, database.unpack_text, deterministic=True)
+
+    def like(user_id, text):
+        # What a search without the index has to do: unpack and scan every response of the user
+        sql = "SELECT id, feature, query FROM searches WHERE user_id=?"
+        params = [user_id]
+        for word in text.split():
+            sql += " AND (query LIKE ? OR unpack_text(response) LIKE ?)"
+            params += [f"%{word}%", f"%{word}%"]
+        return scan.execute(sql + " ORDER BY timestamp DESC LIMIT 20", params).fetchall()
+
+    rng = random.Random(1)
+    # Searches lean towards common words too, but less steeply than the text itself
+    vocabulary, cum_weights = _vocabulary(random.Random(0), skew=0.5)
+    searches = [(rng.randrange(users), " ".join(rng.choices(vocabulary, cum_weights=cum_weights,
+                                                            k=rng.choice((1, 2)))))
+                for _ in range(samples)]
+    fts, naive, hits = [], [], []
+    for user_id, text in searches:
+        started = time.perf_counter()
+        hits.append(len(database.search_history(user_id, text)))
+        fts.append(time.perf_counter() - started)
+    for user_id, text in searches[:max(samples // 10, 5)]:
+        started = time.perf_counter()
+        like(user_id, text)
+        naive.append(time.perf_counter() - started)
+    scan.close()
+
+    database.configure_db(database.DB_PATH)
+    return {
+        "rows": rows,
+        "users": users,
+        "fill_seconds": round(fill_seconds, 2),
+        "db_mb": round(os.path.getsize(path) / 1e6, 1),
+        "fts": _summary(fts),
+        "like_scan": _summary(naive),
+        "mean_hits": round(sum(hits) / len(hits), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.users, args.samples), indent=2))
+
+
+if __name__ == "__main__":
+    main()
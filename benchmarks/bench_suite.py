@@ -0,0 +1,267 @@
+"""Offline benchmark suite: Gemini fallback, database, history and image costs.
+
+Runs against the fake Gemini backend and throwaway databases, so no API key is
+needed, and prints one JSON document. Save it per commit and pass an older
+run to --compare to see what moved.
+
+    python -m benchmarks.bench_suite --output bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_suite --quick --compare bench-abc1234.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+import database
+import gemini
+import history
+import metrics
+import response_cache
+from benchmarks import bench_db
+from benchmarks.fake_genai import FakeBackend
+from imaging import preprocess_image
+from prompts import render_prompt
+
+PRIMARY = gemini.GEMINI_MODELS[0]
+
+# name: (FakeBackend keyword arguments, hedge delay as a multiple of the base latency)
+SCENARIOS = {
+    "healthy": ({}, 0),
+    "primary_quota": ({"errors": {PRIMARY: {"quota": 1.0}}}, 0),
+    "primary_invalid_argument": ({"errors": {PRIMARY: {"invalid_argument": 1.0}}}, 0),
+    "flaky_30pct": ({"errors": {name: {"api_error": 0.3} for name in gemini.GEMINI_MODELS}}, 0),
+    "primary_slow": ({"slow": 10}, 0),
+    "primary_slow_hedged": ({"slow": 10}, 2),
+}
+
+PROMPTS = [
+    render_prompt("nutrigenie", user_query="type 2 diabetes"),
+    render_prompt("calorie_text", food="two boiled eggs"),
+    render_prompt("recipemaster", dietary_preferences="Vegan", health_goal="Weight Loss",
+                  ingredients="garlic, rice, tomato"),
+    render_prompt("smartshopper", planned_recipes="Greek Salad", available_ingredients="tomato"),
+]
+
+
+def _percentile(values, pct):
+    return metrics.percentile(values, pct) if values else None
+
+
+def _latency_summary(latencies):
+    return {
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+    }
+
+
+def bench_gemini(requests=40, base_latency=0.05):
+    """get_gemini_response latency and fallback depth per fault scenario."""
+    results = {}
+    for name, (options, hedge_factor) in SCENARIOS.items():
+        options = dict(options)
+        latency = {PRIMARY: base_latency * options.pop("slow")} if "slow" in options else {}
+        backend = FakeBackend(latency=latency, default_latency=base_latency, **options)
+        latencies, depths, failures = [], [], 0
+        with backend:
+            for i in range(requests):
+                started = time.perf_counter()
+                result = gemini.get_gemini_response(PROMPTS[i % len(PROMPTS)], use_cache=False,
+                                                    hedge_delay=hedge_factor * base_latency)
+                latencies.append(time.perf_counter() - started)
+                if gemini.is_failure(result["response"]):
+                    failures += 1
+                else:
+                    depths.append(gemini.GEMINI_MODELS.index(result["model_used"]))
+        results[name] = dict(
+            _latency_summary(latencies),
+            requests=requests,
+            failures=failures,
+            mean_model_index=round(sum(depths) / len(depths), 2) if depths else None,
+            calls=backend.calls,
+        )
+    return results
+
+
+def _seed_history(user_id, per_feature):
+    for feature in history.HISTORY_FEATURES:
+        for i in range(per_feature):
+            database.save_search(user_id, feature, f"{feature} query number {i} " + "x" * 40,
+                                 PROMPTS[i % len(PROMPTS)] * 3)
+
+
+def bench_history(per_feature=200, samples=50, app=True):
+    """Sidebar history cost: the data loads, and optionally a full app rerun."""
+    user_id = 1
+    _seed_history(user_id, per_feature)
+    cold, warm, pages = [], [], []
+    for _ in range(samples):
+        state = {}
+        started = time.perf_counter()
+        history.load_history(state, user_id)
+        cold.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        history.load_history(state, user_id)
+        warm.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        history.load_more(state, user_id, history.HISTORY_FEATURES[0])
+        pages.append(time.perf_counter() - started)
+    result = {
+        "entries_per_feature": per_feature,
+        "load_cold": _latency_summary(cold),
+        "load_warm": _latency_summary(warm),
+        "load_more": _latency_summary(pages),
+    }
+    if app:
+        result["app_rerun"] = _bench_app_rerun(user_id, samples=max(3, samples // 10))
+    return result
+
+
+def _bench_app_rerun(user_id, samples):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Health_app.py")
+    at = AppTest.from_file(script, default_timeout=120)
+    at.session_state["logged_in"] = True
+    at.session_state["user_id"] = user_id
+    at.session_state["username"] = "bench"
+    at.run()  # first run pays for imports
+    reruns = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - started)
+    return dict(_latency_summary(reruns), exceptions=len(at.exception))
+
+
+def _synthetic_photo(width, height, mode="RGB", fmt="JPEG"):
+    """A noisy gradient with some solid blocks: compresses roughly like a real photo."""
+    rng = random.Random(width * height)
+    image = Image.radial_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width // 8, height // 8), 40).resize((width, height))
+    image = Image.merge("RGB", (image, noise, Image.blend(image, noise, 0.5)))
+    for _ in range(20):
+        x, y = rng.randrange(width), rng.randrange(height)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        image.paste(color, (x, y, min(width, x + width // 10), min(height, y + height // 10)))
+    if mode == "RGBA":
+        image.putalpha(Image.linear_gradient("L").resize((width, height)))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **({"quality": 92} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def bench_imaging(samples=5):
+    """preprocess_image time and output size for typical uploads."""
+    inputs = {
+        "phone_jpeg_4032x3024": _synthetic_photo(4032, 3024),
+        "screenshot_png_1920x1080": _synthetic_photo(1920, 1080, fmt="PNG"),
+        "transparent_png_1200x1200": _synthetic_photo(1200, 1200, mode="RGBA", fmt="PNG"),
+    }
+    results = {}
+    for name, raw in inputs.items():
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            prepared = preprocess_image(raw)
+            timings.append(time.perf_counter() - started)
+        results[name] = dict(_latency_summary(timings), input_kb=round(len(raw) / 1024, 1),
+                             output_kb=round(len(prepared.data) / 1024, 1), mime_type=prepared.mime_type)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, app=True):
+    workdir = tempfile.mkdtemp(prefix="nutrigenie-suite-")
+    response_cache.CACHE_DB_PATH = os.path.join(workdir, "cache.db")
+    metrics.FLUSH_INTERVAL = 0  # keep benchmark events out of any real metrics table
+    database.configure_db(os.path.join(workdir, "users.db"))
+    database.init_db()
+
+    scale = 4 if quick else 1
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "quick": quick,
+        },
+        "gemini": bench_gemini(requests=40 // scale),
+        "history": bench_history(per_feature=200 // scale, samples=50 // scale, app=app),
+        # Runs on its own throwaway database and reconnects to DB_PATH afterwards
+        "database": bench_db.run(writers=4, readers=8, seconds=2.0 / scale),
+        "imaging": bench_imaging(samples=5 // scale + 1),
+    }
+    return results
+
+
+def _numbers(tree, prefix=""):
+    """Flattens nested results into {"a.b.c": number}."""
+    flat = {}
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_numbers(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline, current, threshold=0.10):
+    """Metrics that changed by more than `threshold`, as (path, old, new, relative change)."""
+    old, new = _numbers(baseline), _numbers(current)
+    changes = []
+    for path in sorted(old.keys() & new.keys()):
+        if path.startswith("meta.") or not old[path]:
+            continue
+        delta = (new[path] - old[path]) / abs(old[path])
+        if abs(delta) > threshold:
+            changes.append((path, old[path], new[path], round(delta, 3)))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change worth reporting")
+    parser.add_argument("--quick", action="store_true", help="fewer samples, for a smoke run")
+    parser.add_argument("--no-app", action="store_true", help="skip the full Streamlit rerun measurement")
+    args = parser.parse_args()
+
+    # Model-fallback logging goes to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(quick=args.quick, app=not args.no_app)
+    if args.compare:
+        with open(args.compare) as f:
+            results["comparison"] = [
+                {"metric": path, "before": before, "after": after, "change": change}
+                for path, before, after, change in compare(json.load(f), results, args.threshold)
+            ]
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
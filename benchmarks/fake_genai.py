@@ -0,0 +1,125 @@
+"""Local stand-in for google.generativeai, for benchmarks without an API key.
+
+    backend = FakeBackend(latency={"models/gemini-2.0-flash": 0.8}, errors={"models/gemini-2.0-flash": {"quota": 1.0}})
+    backend.install()     # gemini.py now talks to the fake models
+    ...
+    backend.uninstall()
+
+Each model answers after its configured latency (plus jitter), in `chunks`
+pieces when streamed, and raises ResourceExhausted / InvalidArgument /
+InternalServerError at the configured rates.
+"""
+import random
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core.exceptions import InternalServerError, InvalidArgument, ResourceExhausted
+
+import gemini
+
+# Canned answers picked by a keyword of the prompt; "default" covers everything else
+RESPONSES = {
+    "calories": "**Total Calories: 520 kcal**\n\n| Food | Calories | Protein | Carbs | Fats |\n"
+                "|---|---|---|---|---|\n| Rice | 200 kcal | 4g | 44g | 0g |\n| Chicken | 320 kcal | 30g | 0g | 20g |\n\n"
+                "**Total:** 520 kcal, Protein: 34g, Carbs: 44g, Fats: 20g",
+    "recipes": "1. **Garlic Tomato Rice**\nA quick one-pot dish.\n- rice, tomato, garlic\n1. Cook. 2. Serve.\n"
+               "Calories: 420, Protein: 9g, Carbs: 80g, Fats: 6g",
+    "shopping list": "**Vegetables**\n- onion\n- cucumber\n\n**Dairy**\n- feta cheese",
+    "default": "Here are some healthy recommendations: eat more vegetables, stay hydrated and sleep well. " * 4,
+}
+
+_ERRORS = {
+    "quota": lambda model: ResourceExhausted(f"fake quota exhausted for {model}"),
+    "invalid_argument": lambda model: InvalidArgument(f"fake invalid argument for {model}"),
+    "api_error": lambda model: InternalServerError(f"fake server error for {model}"),
+}
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, backend, model_name):
+        self.backend = backend
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False):
+        prompt = contents[0] if isinstance(contents, list) else contents
+        self.backend.calls[self.model_name] = self.backend.calls.get(self.model_name, 0) + 1
+        latency, error = self.backend.draw(self.model_name)
+        text = self.backend.answer(prompt)
+        if not stream:
+            time.sleep(latency)
+            if error:
+                raise _ERRORS[error](self.model_name)
+            return _Chunk(text)
+        return self._stream(text, latency, error)
+
+    def _stream(self, text, latency, error):
+        # First chunk arrives after half the latency, the rest spread over the other half
+        pieces = self.backend.chunks
+        size = max(1, len(text) // pieces)
+        time.sleep(latency / 2)
+        if error:
+            raise _ERRORS[error](self.model_name)
+        for i in range(0, len(text), size):
+            yield _Chunk(text[i:i + size])
+            time.sleep(latency / 2 / pieces)
+
+
+class FakeBackend:
+    """Configurable fake Gemini: per-model latency, jitter, error rates and answers."""
+
+    def __init__(self, latency=None, default_latency=0.05, jitter=0.2, errors=None, responses=None, chunks=8,
+                 seed=0):
+        self.latency = dict(latency or {})
+        self.default_latency = default_latency
+        self.jitter = jitter                # +/- share of the latency
+        self.errors = dict(errors or {})    # {model: {"quota": rate, "invalid_argument": rate, ...}}
+        self.responses = dict(RESPONSES, **(responses or {}))
+        self.chunks = chunks
+        self.calls = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._original = None
+
+    def draw(self, model_name):
+        """Latency and error (or None) for one call."""
+        with self._lock:
+            base = self.latency.get(model_name, self.default_latency)
+            latency = max(0.0, base * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+            roll = self._rng.random()
+        for kind, rate in self.errors.get(model_name, {}).items():
+            if roll < rate:
+                return latency, kind
+            roll -= rate
+        return latency, None
+
+    def answer(self, prompt):
+        lowered = prompt.lower()
+        for keyword, text in self.responses.items():
+            if keyword != "default" and keyword in lowered:
+                return text
+        return self.responses["default"]
+
+    def install(self):
+        """Points genai.GenerativeModel at the fake and resets the model registry."""
+        self._original = genai.GenerativeModel
+        genai.GenerativeModel = lambda model_name, **kwargs: FakeModel(self, model_name)
+        gemini.registry = gemini.ModelRegistry(gemini.GEMINI_MODELS)
+        return self
+
+    def uninstall(self):
+        if self._original is not None:
+            genai.GenerativeModel = self._original
+            gemini.registry = gemini.ModelRegistry(gemini.GEMINI_MODELS)
+            self._original = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
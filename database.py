@@ -1,37 +1,373 @@
+import json
+import os
+import queue
+import re
 import sqlite3
-import bcrypt
+import threading
+import zlib
+from contextlib import contextmanager
+
 import streamlit as st
 
+import prompts
+from metrics import instrumented
+from passwords import check_password, hash_password, needs_rehash
+
+# Database settings (override through environment variables)
+DB_PATH = os.getenv("NUTRIGENIE_DB_PATH", "users.db")
+POOL_SIZE = int(os.getenv("NUTRIGENIE_DB_POOL_SIZE", 8))
+BUSY_TIMEOUT_SECONDS = float(os.getenv("NUTRIGENIE_DB_BUSY_TIMEOUT", 5))
+CACHE_SIZE_KB = int(os.getenv("NUTRIGENIE_DB_CACHE_KB", 8192))
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections shared by every Streamlit session."""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        # WAL lets readers run alongside a writer; NORMAL sync is safe under WAL
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_SECONDS * 1000)}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_db(path=None, pool_size=None):
+    """Points database.py at another file (tests, benchmarks) and resets the pool."""
+    global DB_PATH, POOL_SIZE, _pool
+    with _pool_lock:
+        if path is not None:
+            DB_PATH = path
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+@contextmanager
+def get_connection():
+    """Borrows a pooled connection; commits on success and rolls back on error."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, POOL_SIZE)
+    pool = _pool
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
+
+# Stored text codec: one version byte followed by the payload
+CODEC_PLAIN = 0
+CODEC_ZLIB = 1
+COMPRESS_MIN_BYTES = 128  # shorter texts don't shrink enough to be worth it
+
+
+def pack_text(text):
+    data = text.encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return bytes([CODEC_ZLIB]) + compressed
+    return bytes([CODEC_PLAIN]) + data
+
+
+def unpack_text(value):
+    """Decodes a packed column; rows written before migration 4 are plain TEXT."""
+    if value is None or isinstance(value, str):
+        return value
+    codec, payload = value[0], value[1:]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == CODEC_PLAIN:
+        return payload.decode("utf-8")
+    raise ValueError(f"Unknown text codec {codec}")
+
+
+def _compact_searches(conn):
+    """Rewrites existing searches: templated prompts become inputs + template id, responses get packed."""
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT id, feature, query, response FROM searches WHERE id > ? ORDER BY id LIMIT 500",
+                            (last_id,)).fetchall()
+        if not rows:
+            break
+        for search_id, feature, query, response in rows:
+            template_id = prompts.FEATURE_TEMPLATES.get(feature)
+            inputs = None
+            if template_id == "nutrigenie":
+                inputs = {"user_query": query}
+            elif template_id and query:
+                inputs = prompts.parse_prompt(template_id, query)
+            if inputs is not None:
+                query = prompts.prompt_title(template_id, inputs)
+                conn.execute("UPDATE searches SET template_id=?, inputs=?, query=? WHERE id=?",
+                             (template_id, prompts.encode_inputs(inputs), query, search_id))
+            if isinstance(response, str):
+                conn.execute("UPDATE searches SET response=? WHERE id=?", (pack_text(response), search_id))
+        last_id = rows[-1][0]
+
+
+def _index_search(conn, search_id, query, response):
+    # Written from Python rather than by a trigger: only Python can unpack the stored response
+    conn.execute("INSERT INTO searches_fts(rowid, query, response) VALUES (?, ?, ?)", (search_id, query, response))
+
+
+def unindex_searches(conn, rows):
+    """Drops searches from the index; `rows` are (id, query, packed response) as stored.
+
+    The index is contentless, so FTS5 needs a row's original text to remove its terms.
+    """
+    conn.executemany("INSERT INTO searches_fts(searches_fts, rowid, query, response) VALUES ('delete', ?, ?, ?)",
+                     [(search_id, query, unpack_text(response)) for search_id, query, response in rows])
+
+
+def _index_searches(conn):
+    """Fills the search index from every stored search."""
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT id, query, response FROM searches WHERE id > ? ORDER BY id LIMIT 500",
+                            (last_id,)).fetchall()
+        if not rows:
+            break
+        for search_id, query, response in rows:
+            _index_search(conn, search_id, query, unpack_text(response))
+        last_id = rows[-1][0]
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each step is a list of SQL statements or callables taking the connection.
+MIGRATIONS = [
+    # 1: baseline schema (IF NOT EXISTS so existing users.db files adopt it as-is)
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            email TEXT UNIQUE,
+            password TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            feature TEXT,
+            query TEXT,
+            response TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+    ]),
+    # 2: serve the sidebar history lookup straight from an index instead of scan + sort.
+    # users.email needs no extra index: its UNIQUE constraint already creates one.
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_searches_user_feature_ts ON searches(user_id, feature, timestamp DESC)",
+    ]),
+    # 3: add id as a tie-breaker so keyset pagination on (timestamp, id) seeks the index
+    (3, [
+        "DROP INDEX IF EXISTS idx_searches_user_feature_ts",
+        "CREATE INDEX IF NOT EXISTS idx_searches_user_feature_ts_id "
+        "ON searches(user_id, feature, timestamp DESC, id DESC)",
+    ]),
+    # 4: store templated searches as template id + inputs and pack responses
+    # (run VACUUM afterwards to hand the freed pages back to the filesystem)
+    (4, [
+        "ALTER TABLE searches ADD COLUMN template_id TEXT",
+        "ALTER TABLE searches ADD COLUMN inputs TEXT",
+        _compact_searches,
+    ]),
+    # 5: per-meal nutrition totals parsed from calorie analyses
+    (5, [
+        """
+        CREATE TABLE IF NOT EXISTS nutrition_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            logged_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            calories REAL,
+            protein REAL,
+            carbs REAL,
+            fats REAL,
+            items TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_nutrition_log_user_time ON nutrition_log(user_id, logged_at)",
+    ]),
+    # 6: recipe -> ingredients map learned from earlier Gemini answers (SmartShopper)
+    (6, [
+        """
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            recipe TEXT PRIMARY KEY,
+            ingredients TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # 7: timings flushed from the metrics ring buffer
+    (7, [
+        """
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL,
+            kind TEXT,
+            name TEXT,
+            feature TEXT,
+            outcome TEXT,
+            latency REAL,
+            attrs TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_metrics_ts ON metrics(ts)",
+    ]),
+    # 8: server-side login sessions (token_hash is a SHA-256 of the cookie's session id)
+    (8, [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER,
+            username TEXT,
+            created_at REAL,
+            expires_at REAL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)",
+    ]),
+    # 9: full-text index over saved searches. Contentless: it keeps only the terms, the text
+    # stays packed in searches. save_search() and unindex_searches() keep it in sync, since
+    # only Python can unpack responses (a search deleted by another client leaves stale terms,
+    # which the join back to searches hides).
+    (9, [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS searches_fts USING fts5("
+        "query, response, content='', tokenize='porter unicode61')",
+        _index_searches,
+    ]),
+    # 10: RecipeMaster answers and request counts (pre-warm ranks on them)
+    (10, [
+        """
+        CREATE TABLE IF NOT EXISTS recipe_results (
+            key TEXT PRIMARY KEY,
+            preference TEXT,
+            goal TEXT,
+            ingredients TEXT,
+            response TEXT,
+            created_at REAL,
+            last_used REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_recipe_results_last_used ON recipe_results(last_used)",
+        """
+        CREATE TABLE IF NOT EXISTS recipe_requests (
+            key TEXT PRIMARY KEY,
+            preference TEXT,
+            goal TEXT,
+            ingredients TEXT,
+            count INTEGER DEFAULT 0,
+            last_seen REAL
+        )
+        """,
+    ]),
+    # 11: perceptual hashes of analysed meal photos (near-duplicate uploads reuse the answer)
+    (11, [
+        """
+        CREATE TABLE IF NOT EXISTS image_analyses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dhash INTEGER,
+            ahash INTEGER,
+            response TEXT,
+            created_at REAL,
+            last_used REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_image_analyses_last_used ON image_analyses(last_used)",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Brings the database up to SCHEMA_VERSION; each step runs in its own transaction."""
+    for version, steps in MIGRATIONS:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock in case another process migrated first
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version={version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"[DB] Migrated {DB_PATH} to schema version {version}")
+
+
 # Initialize Database
+@instrumented("db")
 def init_db():
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-
-    # Create users table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE,
-        email TEXT UNIQUE,
-        password TEXT
-    )
-    """)
-
-    # Create searches table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS searches (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        feature TEXT,
-        query TEXT,
-        response TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        migrate(conn)
 
 # def init_db():
 #     conn = sqlite3.connect("users.db")
@@ -65,38 +401,75 @@ def init_db():
 
 # Register User
 def register_user(username, email, password):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-
     # Check if user exists
-    cursor.execute("SELECT * FROM users WHERE email=?", (email,))
-    if cursor.fetchone():
+    if find_user(email):
         return "User already exists!"
 
-    # Hash password
-    hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    # Hash password in the bcrypt worker pool (outside the connection so the pool slot isn't held)
+    hashed_password = hash_password(password)
 
-    # Insert user
-    cursor.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)", 
-    (username, email, hashed_password))
-    conn.commit()
-    conn.close()
+    # Insert user (the UNIQUE columns catch a sign-up that raced us through the hashing)
+    try:
+        insert_user(username, email, hashed_password)
+    except sqlite3.IntegrityError:
+        return "User already exists!"
     return "User registered successfully!"
 
 # Authenticate User
 def login_user(email, password):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-
     # Fetch user data
-    cursor.execute("SELECT id, username, password FROM users WHERE email=?", (email,))
-    user = cursor.fetchone()
-    conn.close()
+    user = find_user(email)
 
-    if user and bcrypt.checkpw(password.encode(), user[2]):
+    if user and check_password(password, user[2]):
+        # Bring hashes made with an older work factor up to NUTRIGENIE_BCRYPT_ROUNDS
+        if needs_rehash(user[2]):
+            update_password(user[0], hash_password(password))
         return {"id": user[0], "username": user[1]}  # Return user info
     return None  # Invalid login
 
+# User rows (register_user and login_user time only these; hashing is its own "hash" metric)
+@instrumented("db")
+def find_user(email):
+    with get_connection() as conn:
+        return conn.execute("SELECT id, username, password FROM users WHERE email=?", (email,)).fetchone()
+
+@instrumented("db")
+def insert_user(username, email, hashed_password):
+    with get_connection() as conn:
+        conn.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+        (username, email, hashed_password))
+
+@instrumented("db")
+def update_password(user_id, hashed_password):
+    with get_connection() as conn:
+        conn.execute("UPDATE users SET password=? WHERE id=?", (hashed_password, user_id))
+
+# Login Sessions
+@instrumented("db")
+def create_session(token_hash, user_id, username, expires_at):
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT INTO sessions (token_hash, user_id, username, created_at, expires_at) "
+            "VALUES (?, ?, ?, strftime('%s', 'now'), ?)",
+            (token_hash, user_id, username, expires_at))
+
+@instrumented("db")
+def get_session(token_hash):
+    """(user_id, username, expires_at) for a session, or None."""
+    with get_connection() as conn:
+        return conn.execute("SELECT user_id, username, expires_at FROM sessions WHERE token_hash=?",
+                            (token_hash,)).fetchone()
+
+@instrumented("db")
+def delete_session(token_hash):
+    with get_connection() as conn:
+        conn.execute("DELETE FROM sessions WHERE token_hash=?", (token_hash,))
+
+@instrumented("db")
+def delete_expired_sessions(now):
+    with get_connection() as conn:
+        return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
 # Save Search
 # def save_search(user_id, query, response):
 #     conn = sqlite3.connect("users.db")
@@ -104,13 +477,20 @@ def login_user(email, password):
 #     cursor.execute("INSERT INTO searches (user_id, query, response) VALUES (?, ?, ?)", (user_id, query, response))
 #     conn.commit()
 #     conn.close()
-def save_search(user_id, feature, query, response):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO searches (user_id, feature, query, response) VALUES (?, ?, ?, ?)", 
-    (user_id, feature, query, response))
-    conn.commit()
-    conn.close()
+@instrumented("db")
+def save_search(user_id, feature, query, response, template_id=None, inputs=None):
+    """Stores a search and returns its id.
+
+    For templated features pass the template id and its inputs with a short `query`
+    label instead of the full prompt; the prompt can be rebuilt from prompts.py.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute("INSERT INTO searches (user_id, feature, query, response, template_id, inputs) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+        (user_id, feature, query, pack_text(response), template_id,
+         prompts.encode_inputs(inputs) if inputs is not None else None))
+        _index_search(conn, cursor.lastrowid, query, response)
+        return cursor.lastrowid
 
 
 # Retrieve Previous Searches
@@ -123,20 +503,204 @@ def save_search(user_id, feature, query, response):
 #     conn.close()
 #     return rows
 
+@instrumented("db")
 def get_previous_searches(user_id, feature):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, query, response FROM searches WHERE user_id=? AND feature=? ORDER BY timestamp DESC LIMIT 10", 
-    (user_id, feature))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with get_connection() as conn:
+        rows = conn.execute("SELECT id, query, response FROM searches WHERE user_id=? AND feature=? ORDER BY timestamp DESC LIMIT 10",
+        (user_id, feature)).fetchall()
+    return [(search_id, query, unpack_text(response)) for search_id, query, response in rows]
+
+
+# History listing: summaries only (id, title, timestamp); full responses load on demand
+HISTORY_TITLE_LENGTH = 40
+
+
+@instrumented("db")
+def get_search_history(user_id, features, limit=10):
+    """First page of summaries for each feature in one round trip: {feature: [(id, title, timestamp)]}."""
+    # One index-backed LIMIT per feature, glued with UNION ALL so each stays a short range scan
+    branch = ("SELECT * FROM (SELECT id, feature, substr(query, 1, ?), timestamp FROM searches "
+              "WHERE user_id=? AND feature=? ORDER BY timestamp DESC, id DESC LIMIT ?)")
+    params = []
+    for feature in features:
+        params += [HISTORY_TITLE_LENGTH, user_id, feature, limit]
+    history = {feature: [] for feature in features}
+    with get_connection() as conn:
+        rows = conn.execute(" UNION ALL ".join([branch] * len(features)), params).fetchall()
+    for search_id, feature, title, timestamp in rows:
+        history[feature].append((search_id, title, timestamp))
+    return history
+
+
+@instrumented("db")
+def get_history_page(user_id, feature, before=None, limit=10):
+    """Next page of summaries older than the `before` (timestamp, id) cursor."""
+    with get_connection() as conn:
+        if before is None:
+            return conn.execute(
+                "SELECT id, substr(query, 1, ?), timestamp FROM searches WHERE user_id=? AND feature=? "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (HISTORY_TITLE_LENGTH, user_id, feature, limit)).fetchall()
+        return conn.execute(
+            "SELECT id, substr(query, 1, ?), timestamp FROM searches WHERE user_id=? AND feature=? "
+            "AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (HISTORY_TITLE_LENGTH, user_id, feature, before[0], before[1], limit)).fetchall()
+
+
+# Full-text search over saved searches
+SNIPPET_TOKENS = 16
+
+
+def match_query(text):
+    """FTS5 query for free text: every word must match, the last one as a prefix (search-as-you-type)."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def _hit_prefixes(text):
+    # Rough stand-in for the index's porter stemmer: a hit is a word starting with a query stem
+    prefixes = []
+    for word in re.findall(r"\w+", text.lower()):
+        stem = re.sub(r"(?:ing|ed|es|s|ly)$", "", word)
+        prefixes.append(stem if len(stem) >= 3 else word)
+    return tuple(prefixes)
 
 
+def _snippet_markdown(text, prefixes, size=SNIPPET_TOKENS):
+    """Excerpt of `text` around its densest run of hits, hits in **bold**.
+
+    A contentless index can't build snippets, so this works on the unpacked response.
+    """
+    # Markdown from the stored answer would clash with the bold markers, so drop it first
+    words = re.sub(r"[*_#`|>]+", " ", text or "").split()
+    hits = [any(part.startswith(prefixes) for part in re.findall(r"\w+", word.lower())) for word in words]
+    start = best = window = 0
+    for i, hit in enumerate(hits):
+        window += hit - (hits[i - size] if i >= size else 0)
+        if window > best:
+            best, start = window, max(0, i - size + 1)
+    if best:
+        # Lead in with a few words of context instead of ending the excerpt on the hit
+        first = hits.index(True, start)
+        start = max(0, min(first - size // 4, len(words) - size))
+    excerpt = [f"**{word}**" if hit else word for word, hit in zip(words[start:start + size], hits[start:start + size])]
+    return ("…" if start else "") + " ".join(excerpt) + ("…" if start + size < len(words) else "")
+
+
+@instrumented("db")
+def search_history(user_id, text, features=None, limit=20):
+    """Best matches first: [(id, feature, title, snippet, timestamp)], hits in the snippet in **bold**.
+
+    Titles weigh more than responses; `features` limits the search to those features.
+    """
+    query = match_query(text)
+    if query is None:
+        return []
+    sql = ("SELECT s.id, s.feature, substr(s.query, 1, ?), s.response, s.timestamp "
+           "FROM searches_fts JOIN searches s ON s.id = searches_fts.rowid "
+           "WHERE searches_fts MATCH ? AND s.user_id = ?")
+    params = [HISTORY_TITLE_LENGTH, query, user_id]
+    if features:
+        sql += f" AND s.feature IN ({','.join('?' * len(features))})"
+        params += list(features)
+    sql += " ORDER BY bm25(searches_fts, 4.0, 1.0), s.timestamp DESC LIMIT ?"
+    params.append(limit)
+    with get_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    prefixes = _hit_prefixes(text)
+    return [(search_id, feature, title, _snippet_markdown(unpack_text(response), prefixes), timestamp)
+            for search_id, feature, title, response, timestamp in rows]
+
+
+@instrumented("db")
+def get_search_response(search_id):
+    with get_connection() as conn:
+        row = conn.execute("SELECT response FROM searches WHERE id=?", (search_id,)).fetchone()
+    return unpack_text(row[0]) if row else None
+
+
+@instrumented("db")
 def delete_search(search_id):
     """Deletes a specific search from the database."""
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM searches WHERE id=?", (search_id,))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with get_connection() as conn:
+        unindex_searches(conn, conn.execute("SELECT id, query, response FROM searches WHERE id=?",
+                                            (search_id,)).fetchall())
+        conn.execute("DELETE FROM searches WHERE id=?", (search_id,))
+
+
+# Nutrition Log
+@instrumented("db")
+def log_meal(user_id, record, logged_at=None):
+    """Stores a nutrition.MealRecord and returns its id."""
+    items = json.dumps([item.as_tuple() for item in record.items], separators=(",", ":"))
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO nutrition_log (user_id, logged_at, calories, protein, carbs, fats, items) "
+            "VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?, ?, ?)",
+            (user_id, logged_at, record.calories, record.protein, record.carbs, record.fats, items))
+        return cursor.lastrowid
+
+
+@instrumented("db")
+def get_daily_intake(user_id, days=30):
+    """Daily totals for the last `days` days with a 7-calendar-day rolling calorie average.
+
+    Rows: (day, calories, protein, carbs, fats, meals, calories_7d_avg). Aggregation and the
+    rolling window run inside SQLite, so cost grows with the days returned, not meals logged.
+    """
+    with get_connection() as conn:
+        return conn.execute("""
+        WITH daily AS (
+            SELECT date(logged_at) AS day, SUM(calories) AS calories, SUM(protein) AS protein,
+                   SUM(carbs) AS carbs, SUM(fats) AS fats, COUNT(*) AS meals
+            FROM nutrition_log
+            WHERE user_id=? AND logged_at >= date('now', ?)
+            GROUP BY day
+        ), rolling AS (
+            SELECT *, AVG(calories) OVER (
+                ORDER BY julianday(day) RANGE BETWEEN 6 PRECEDING AND CURRENT ROW
+            ) AS calories_7d_avg
+            FROM daily
+        )
+        SELECT day, ROUND(calories, 1), ROUND(protein, 1), ROUND(carbs, 1), ROUND(fats, 1), meals,
+               ROUND(calories_7d_avg, 1)
+        FROM rolling WHERE day >= date('now', ?) ORDER BY day
+        """, (user_id, f"-{days + 6} days", f"-{days - 1} days")).fetchall()
+
+
+@instrumented("db")
+def get_weekly_intake(user_id, weeks=12):
+    """Weekly totals and average calories per logged day: (week, calories, protein, carbs, fats, avg_daily_calories)."""
+    with get_connection() as conn:
+        return conn.execute("""
+        SELECT strftime('%Y-W%W', logged_at) AS week, ROUND(SUM(calories), 1), ROUND(SUM(protein), 1),
+               ROUND(SUM(carbs), 1), ROUND(SUM(fats), 1),
+               ROUND(SUM(calories) / COUNT(DISTINCT date(logged_at)), 1)
+        FROM nutrition_log
+        WHERE user_id=? AND logged_at >= date('now', ?)
+        GROUP BY week ORDER BY week
+        """, (user_id, f"-{weeks * 7} days")).fetchall()
+
+
+# Recipe Ingredients
+@instrumented("db")
+def get_recipe_ingredients(recipes):
+    """Known ingredient lists for the given normalized recipe names: {recipe: [ingredient]}."""
+    recipes = list(recipes)
+    if not recipes:
+        return {}
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT recipe, ingredients FROM recipe_ingredients WHERE recipe IN ({','.join('?' * len(recipes))})",
+            recipes).fetchall()
+    return {recipe: json.loads(ingredients) for recipe, ingredients in rows}
+
+
+@instrumented("db")
+def save_recipe_ingredients(recipe_map):
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO recipe_ingredients (recipe, ingredients, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+            [(recipe, json.dumps(sorted(ingredients))) for recipe, ingredients in recipe_map.items()])
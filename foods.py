@@ -0,0 +1,228 @@
+import bisect
+import csv
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Bundled food composition table (per typical serving)
+FOODS_PATH = os.getenv("NUTRIGENIE_FOODS_PATH",
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv"))
+MATCH_THRESHOLD = 0.6  # minimum trigram similarity (Dice coefficient) for a fuzzy match
+WORD_THRESHOLD = 0.5   # per-word similarity that still counts as the same word (typos, plurals)
+MAX_CANDIDATES = 64    # fuzzy candidates scored per lookup, closest name length first
+
+# Query words that don't name a food ("a banana", "2 boiled eggs")
+_IGNORED_WORDS = {"a", "an", "the", "of", "one", "two", "three", "some", "small", "medium", "large"}
+
+
+class Food:
+    __slots__ = ("name", "serving", "calories", "protein", "carbs", "fats")
+
+    def __init__(self, name, serving, calories, protein, carbs, fats):
+        self.name = name
+        self.serving = serving
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fats = fats
+
+
+def normalize_name(text):
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", text.lower()).split())
+
+
+def trigrams(text):
+    padded = f"  {normalize_name(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def covers(query, name):
+    """True when every word of the query appears (allowing typos and plurals) in the food name.
+
+    Stops dish names from matching one of their ingredients: "banana bread" is not "banana".
+    """
+    name_words = [trigrams(word) for word in normalize_name(name).split()]
+    for word in normalize_name(query).split():
+        if word in _IGNORED_WORDS or word.isdigit():
+            continue
+        grams = trigrams(word)
+        if not any(_dice(grams, name_grams) >= WORD_THRESHOLD for name_grams in name_words):
+            return False
+    return True
+
+
+class FoodIndex:
+    """In-memory food table with an exact-name map and word and trigram inverted indexes.
+
+    Every distinct name word is stored once with its trigram set. A fuzzy lookup
+    first finds the indexed words close to each query word, so only names that
+    cover the query are scored; posting lists are ordered by the food's trigram
+    count, so only names whose length could reach the similarity threshold are
+    visited, and at most MAX_CANDIDATES of them.
+    """
+
+    def __init__(self, foods):
+        self.foods = list(foods)
+        self._exact = {}
+        self._grams = []
+        self._sizes = []        # per food: trigram count of its name
+        self._vocab = {}        # word -> id
+        self._word_grams = []   # id -> trigram set of the word
+        postings = defaultdict(list)
+        word_postings = defaultdict(list)
+        for food_id, food in enumerate(self.foods):
+            key = normalize_name(food.name)
+            self._exact.setdefault(key, food_id)
+            grams = trigrams(key)
+            self._grams.append(grams)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append((len(grams), food_id))
+            for word_id in {self._word_id(word) for word in key.split()}:
+                word_postings[word_id].append((len(grams), food_id))
+        self._postings, self._posting_sizes = self._sorted_postings(postings)
+        self._word_postings, self._word_posting_sizes = self._sorted_postings(word_postings)
+        self._word_foods = {word_id: set(food_ids) for word_id, food_ids in self._word_postings.items()}
+        self._vocab_postings = defaultdict(list)
+        for word_id, grams in enumerate(self._word_grams):
+            for gram in grams:
+                self._vocab_postings[gram].append(word_id)
+
+    def _word_id(self, word):
+        if word not in self._vocab:
+            self._vocab[word] = len(self._word_grams)
+            self._word_grams.append(trigrams(word))
+        return self._vocab[word]
+
+    @staticmethod
+    def _sorted_postings(postings):
+        ids, sizes = {}, {}
+        for key, entries in postings.items():
+            entries.sort()
+            sizes[key] = [size for size, _ in entries]
+            ids[key] = [food_id for _, food_id in entries]
+        return ids, sizes
+
+    def __len__(self):
+        return len(self.foods)
+
+    def _similar_words(self, word):
+        """Ids of the indexed words within WORD_THRESHOLD of `word`."""
+        grams = trigrams(word)
+        ids = set()
+        for gram in grams:
+            ids.update(self._vocab_postings.get(gram, ()))
+        return {word_id for word_id in ids if _dice(grams, self._word_grams[word_id]) >= WORD_THRESHOLD}
+
+    def _band(self, postings, sizes, key, min_size, max_size, size=None):
+        """Foods of one posting list in the length band; with `size`, only the MAX_CANDIDATES either side of it."""
+        key_sizes = sizes[key]
+        start = bisect.bisect_left(key_sizes, min_size)
+        stop = bisect.bisect_right(key_sizes, max_size)
+        if size is not None:
+            middle = bisect.bisect_left(key_sizes, size, start, stop)
+            start, stop = max(start, middle - MAX_CANDIDATES), min(stop, middle + MAX_CANDIDATES)
+        return postings[key][start:stop]
+
+    def _covering(self, words, size, min_size, max_size):
+        """Foods in the length band whose names cover every query word (see `covers`)."""
+        similar = [self._similar_words(word) for word in set(words)]
+        if not all(similar):
+            return []
+        # Start from the query word with the fewest names in the band and narrow by the others
+        similar.sort(key=lambda ids: sum(len(self._band(self._word_postings, self._word_posting_sizes, word_id,
+                                                         min_size, max_size)) for word_id in ids))
+        # A single query word is covered by every name in the band, so only the nearest lengths are needed
+        near = size if len(similar) == 1 else None
+        candidates = set()
+        for word_id in similar[0]:
+            candidates.update(self._band(self._word_postings, self._word_posting_sizes, word_id,
+                                         min_size, max_size, near))
+        for ids in similar[1:]:
+            candidates = set().union(*[candidates & self._word_foods[word_id] for word_id in ids])
+        if len(candidates) > MAX_CANDIDATES:
+            # Closest name lengths first: they bound the best reachable score
+            candidates = sorted(candidates, key=self._sizes.__getitem__)
+            middle = bisect.bisect_left([self._sizes[food_id] for food_id in candidates], size)
+            start = max(0, min(middle - MAX_CANDIDATES // 2, len(candidates) - MAX_CANDIDATES))
+            candidates = candidates[start:start + MAX_CANDIDATES]
+        return candidates
+
+    def _sharing(self, grams, threshold, min_size, max_size):
+        """Foods in the length band that may share enough trigrams with the query."""
+        # Anything sharing `needed` trigrams appears in one of the (len(grams) - needed + 1)
+        # rarest posting lists, so only those lists are scanned, and only the length band.
+        needed = max(1, int(threshold * len(grams) / (2 - threshold)))
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        prefix = [gram for gram in rarest[:len(grams) - needed + 1] if gram in self._postings]
+        hits = Counter()
+        for gram in prefix:
+            hits.update(self._band(self._postings, self._posting_sizes, gram, min_size, max_size))
+        unscanned = len(grams) - len(prefix)
+        # Longer names need more shared trigrams; skip those the prefix already rules out
+        candidates = [food_id for food_id, prefix_hits in hits.items()
+                      if prefix_hits + unscanned >= math.ceil(threshold * (len(grams) + self._sizes[food_id]) / 2)]
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = heapq.nlargest(MAX_CANDIDATES, candidates, key=lambda food_id: (hits[food_id], -food_id))
+        return candidates
+
+    def search(self, query, limit=5, threshold=MATCH_THRESHOLD):
+        """Returns [(score, Food)] best first; an exact name match scores 1.0."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        if key in self._exact:
+            return [(1.0, self.foods[self._exact[key]])]
+
+        grams = trigrams(key)
+        # Dice >= threshold bounds the candidate's trigram count
+        min_size = threshold * len(grams) / (2 - threshold)
+        max_size = len(grams) * (2 - threshold) / threshold
+        words = [word for word in key.split() if word not in _IGNORED_WORDS and not word.isdigit()]
+        if words:
+            candidates = self._covering(words, len(grams), min_size, max_size)
+        else:
+            candidates = self._sharing(grams, threshold, min_size, max_size)
+
+        scored = []
+        for food_id in candidates:
+            score = 2 * len(grams & self._grams[food_id]) / (len(grams) + self._sizes[food_id])
+            if score >= threshold:
+                scored.append((score, food_id))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(round(score, 3), self.foods[food_id]) for score, food_id in scored[:limit]]
+
+    def match(self, query, threshold=MATCH_THRESHOLD):
+        """Best single match, or None if nothing is similar enough."""
+        results = self.search(query, limit=1, threshold=threshold)
+        return results[0][1] if results else None
+
+
+def load_foods(path=FOODS_PATH):
+    with open(path, newline="", encoding="utf-8") as handle:
+        return [
+            Food(row["name"], row["serving"], float(row["calories"]), float(row["protein"]),
+                 float(row["carbs"]), float(row["fats"]))
+            for row in csv.DictReader(handle)
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_food_index():
+    """The bundled table, loaded and indexed once per process."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FoodIndex(load_foods())
+    return _index
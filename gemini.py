@@ -0,0 +1,564 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import response_cache
+
+# Define models in priority order
+GEMINI_MODELS = [
+    "models/gemini-2.0-flash",
+    "models/gemini-2.0-flash-lite",
+    "models/gemini-1.5-pro",
+    "models/gemini-1.5-flash"
+]
+
+# Circuit breaker settings
+FAILURE_THRESHOLD = 3          # consecutive failures before a model is skipped
+HEALTH_HALF_LIFE = 300         # seconds after which an outcome counts half as much
+HEALTH_MIN_SAMPLES = 5         # (decayed) recent calls needed before a model can be re-ranked
+LATENCY_BAND = 2.0             # seconds; average latencies in the same band rank alike
+COOLDOWNS = {                  # seconds a tripped model stays skipped, by failure type
+    "quota": 60,
+    "api_error": 30,
+    "slow": 60,
+    "unknown": 30,
+}
+
+# Hedged request settings: after HEDGE_DELAY seconds without a first chunk, the next
+# model is started in parallel. 0 keeps the plain sequential fallback.
+HEDGE_DELAY = float(os.getenv("NUTRIGENIE_HEDGE_DELAY", 0))
+HEAVY_HEDGE_DELAY = float(os.getenv("NUTRIGENIE_HEAVY_HEDGE_DELAY", 4))
+MAX_HEDGED_INFLIGHT = int(os.getenv("NUTRIGENIE_MAX_HEDGED", 4))
+HEDGE_POOL_SIZE = int(os.getenv("NUTRIGENIE_HEDGE_POOL_SIZE", 32))
+
+
+_sdk = None
+_sdk_lock = threading.Lock()
+
+
+def _genai():
+    """Imports and configures google.generativeai on first use; the import alone takes about a second."""
+    global _sdk
+    with _sdk_lock:
+        if _sdk is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _sdk = genai
+    return _sdk
+
+
+class ModelHealth:
+    """Rolling health record for one Gemini model."""
+
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self.model = None
+        self.successes = 0.0   # decayed counts of recent outcomes
+        self.calls = 0.0
+        self.updated = time.time()
+        self.failures = {}
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.avg_latency = None
+
+    def _decay(self, now):
+        factor = 0.5 ** (max(0.0, now - self.updated) / HEALTH_HALF_LIFE)
+        self.successes *= factor
+        self.calls *= factor
+        self.updated = now
+
+    def record(self, ok, now):
+        self._decay(now)
+        self.calls += 1
+        self.successes += ok
+
+    def reset(self):
+        self.successes = self.calls = 0.0
+        self.avg_latency = None
+
+    def success_rate(self, now=None):
+        """Share of recent calls that succeeded, or None while there are too few to judge."""
+        self._decay(now or time.time())
+        if self.calls < HEALTH_MIN_SAMPLES:
+            return None
+        return self.successes / self.calls
+
+    def rank(self, now):
+        """Sort key: success rate in 10% bands, then latency band, then configured priority.
+
+        A model without enough recent calls keeps its configured place, so one transient
+        error can't demote it, and a demoted model drifts back once its old calls decay.
+        """
+        rate = self.success_rate(now)
+        if rate is None:
+            return (-1.0, 0, self.priority)
+        latency = int(self.avg_latency // LATENCY_BAND) if self.avg_latency is not None else 0
+        return (-round(rate, 1), latency, self.priority)
+
+    def is_open(self, now):
+        return now < self.open_until
+
+
+class ModelRegistry:
+    """Process-wide model instances and health, shared by every Streamlit session."""
+
+    def __init__(self, model_names):
+        self._lock = threading.Lock()
+        self._health = {name: ModelHealth(name, i) for i, name in enumerate(model_names)}
+
+    def get_model(self, name):
+        health = self._health[name]
+        with self._lock:
+            if health.model is None:
+                health.model = _genai().GenerativeModel(model_name=name)
+            return health.model
+
+    def ordered(self):
+        """Models with a closed circuit, best recent record first; tripped models are only tried last."""
+        now = time.time()
+        with self._lock:
+            healthy = sorted((h for h in self._health.values() if not h.is_open(now)), key=lambda h: h.rank(now))
+            tripped = [h for h in self._health.values() if h.is_open(now)]
+        tripped.sort(key=lambda h: h.open_until)
+        return [h.name for h in healthy] + [h.name for h in tripped]
+
+    def open_circuits(self):
+        now = time.time()
+        with self._lock:
+            return {h.name for h in self._health.values() if h.is_open(now)}
+
+    def record_success(self, name, latency):
+        health = self._health[name]
+        with self._lock:
+            health.record(1, time.time())
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            if health.avg_latency is None:
+                health.avg_latency = latency
+            else:
+                health.avg_latency = 0.8 * health.avg_latency + 0.2 * latency
+
+    def record_dropped(self, name, elapsed):
+        """A hedged attempt overtaken by a later one: charge its time and count it as slow."""
+        health = self._health[name]
+        with self._lock:
+            if health.avg_latency is None:
+                health.avg_latency = elapsed
+            else:
+                health.avg_latency = 0.8 * health.avg_latency + 0.2 * elapsed
+        self.record_failure(name, "slow")
+
+    def record_failure(self, name, kind):
+        health = self._health[name]
+        with self._lock:
+            health.failures[kind] = health.failures.get(kind, 0) + 1
+            # A bad prompt says nothing about the model's availability
+            if kind == "invalid_argument":
+                return
+            health.record(0, time.time())
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= FAILURE_THRESHOLD or kind == "quota":
+                cooldown = COOLDOWNS.get(kind, COOLDOWNS["unknown"])
+                health.open_until = time.time() + cooldown
+                # Half-open after the cooldown: start the model over with a clean slate
+                health.reset()
+                print(f"[Circuit Open] - {name} for {cooldown}s")
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "model": h.name,
+                    "success_rate": h.success_rate(now),
+                    "avg_latency": h.avg_latency,
+                    "failures": dict(h.failures),
+                    "circuit_open": h.is_open(now),
+                }
+                for h in sorted(self._health.values(), key=lambda h: h.priority)
+            ]
+
+
+registry = ModelRegistry(GEMINI_MODELS)
+
+
+class RateLimiter:
+    """Per-model requests-per-minute budget over a sliding 60 second window.
+
+    `rpm` is the default budget; `overrides` maps model names to their own.
+    """
+
+    WINDOW = 60.0
+
+    def __init__(self, rpm, overrides=None):
+        self.rpm = rpm
+        self.overrides = dict(overrides or {})
+        self._calls = {}
+        self._cond = threading.Condition()
+
+    def _budget(self, name):
+        return self.overrides.get(name, self.rpm)
+
+    def _wait_time(self, name, now):
+        """Seconds until `name` has room for one more call (0 when it has room now)."""
+        calls = self._calls.setdefault(name, deque())
+        while calls and now - calls[0] >= self.WINDOW:
+            calls.popleft()
+        if len(calls) < self._budget(name):
+            return 0.0
+        if not calls:
+            return self.WINDOW
+        return calls[0] + self.WINDOW - now
+
+    def try_acquire(self, name):
+        with self._cond:
+            now = time.time()
+            if self._wait_time(name, now) > 0:
+                return False
+            self._calls[name].append(now)
+            return True
+
+    def acquire_any(self, names):
+        """Blocks until one of `names` has budget left, takes it and returns that name."""
+        with self._cond:
+            while True:
+                now = time.time()
+                waits = [(self._wait_time(name, now), i, name) for i, name in enumerate(names)
+                         if self._budget(name) > 0]
+                if not waits:
+                    return None
+                wait, _, name = min(waits)
+                if wait <= 0:
+                    self._calls[name].append(now)
+                    return name
+                self._cond.wait(wait)
+
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="gemini-hedge")
+_hedge_slots = threading.BoundedSemaphore(MAX_HEDGED_INFLIGHT)
+
+
+FAILURE_MESSAGE = "🚫 All Gemini models failed due to quota or configuration issues. Please try again later."
+INTERRUPTED_MESSAGE = "\n\n⚠️ The response was interrupted. Please try again."
+
+
+def is_failure(text):
+    """True for the fallback messages, which must never be cached or reused."""
+    return not text or text == FAILURE_MESSAGE or text.endswith(INTERRUPTED_MESSAGE)
+
+
+def _contents(prompt, image_data):
+    # Check if image data is provided
+    if image_data:
+        return [prompt, image_data[0]]
+    return prompt
+
+
+def _record_error(model_name, error):
+    """Logs a failed attempt, charges it to the model's health record and returns its kind."""
+    from google.api_core.exceptions import ResourceExhausted, GoogleAPIError, InvalidArgument
+
+    if isinstance(error, ResourceExhausted):
+        print(f"[Quota Exhausted] - {model_name}")
+        kind = "quota"
+    elif isinstance(error, InvalidArgument):
+        print(f"[Invalid Argument] - {model_name}: {error}")
+        kind = "invalid_argument"
+    elif isinstance(error, GoogleAPIError):
+        print(f"[API Error] - {model_name}: {error}")
+        kind = "api_error"
+    else:
+        print(f"[Unknown Error] - {model_name}: {error}")
+        kind = "unknown"
+    registry.record_failure(model_name, kind)
+    return kind
+
+
+def _record_attempt(model_name, outcome, started, prompt, image_data, response_chars=0, depth=0, feature=None,
+                    hedge=False):
+    """One metrics event per model attempt; depth 0 is the first model tried."""
+    metrics.record("llm", model_name, time.time() - started, outcome, feature=feature,
+                   prompt_chars=len(prompt), images=len(image_data or []), response_chars=response_chars,
+                   depth=depth, hedge=hedge)
+
+
+def _record_cache_hit(cached, started, prompt, image_data):
+    _record_attempt(cached["model_used"] or "cache", "cache_hit", started, prompt, image_data,
+                    len(cached["response"]))
+
+
+def _chunk_text(chunk):
+    # Blocked or empty chunks raise instead of returning ""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class _Attempt:
+    """One in-flight model call of a hedged request."""
+
+    def __init__(self, model_name, hedge, depth):
+        self.model_name = model_name
+        self.hedge = hedge
+        self.depth = depth
+        self.feature = metrics.current_feature()  # pool threads don't see the caller's context
+        self.cancelled = threading.Event()
+        self.started = time.time()
+
+
+def _run_attempt(attempt, prompt, image_data, events):
+    """Streams one model into the shared event queue until done, failed or dropped."""
+    started = time.time()
+    got_text = False
+    received = 0
+    outcome = "cancelled"
+    try:
+        model = registry.get_model(attempt.model_name)
+        for chunk in model.generate_content(_contents(prompt, image_data), stream=True):
+            if attempt.cancelled.is_set():
+                return
+            text = _chunk_text(chunk)
+            if text.strip() or got_text:
+                got_text = True
+                received += len(text)
+                events.put((attempt, "chunk", text))
+        if got_text:
+            registry.record_success(attempt.model_name, time.time() - started)
+            outcome = "ok"
+        else:
+            registry.record_failure(attempt.model_name, "empty")
+            outcome = "empty"
+        events.put((attempt, "done", None))
+    except Exception as e:
+        if not attempt.cancelled.is_set():
+            outcome = _record_error(attempt.model_name, e)
+        events.put((attempt, "error", e))
+    finally:
+        _record_attempt(attempt.model_name, outcome, started, prompt, image_data, received, attempt.depth,
+                        attempt.feature, attempt.hedge)
+        if attempt.hedge:
+            _hedge_slots.release()
+
+
+def _hedged_chunks(prompt, image_data, delay, outcome, first_model=None, rate_limiter=None):
+    """Yields chunks from whichever model produces text first.
+
+    A slow model gets company after `delay` seconds (up to MAX_HEDGED_INFLIGHT extra
+    calls per process); a failed one is replaced right away. Once a model has sent its
+    first chunk the others are dropped; one started earlier that still lost is charged
+    as slow, so a model that keeps losing trips its circuit. With a `rate_limiter`, every
+    model but `first_model` (already granted) is only called when its try_acquire()
+    succeeds. `outcome` receives the winning model and whether its stream completed.
+    """
+    candidates = _candidates(first_model)
+    total = len(candidates)
+    events = queue.Queue()
+    live = []
+    winner = None
+
+    def launch(hedge):
+        while candidates:
+            model_name = candidates.pop(0)
+            if rate_limiter is None or model_name == first_model or rate_limiter.try_acquire(model_name):
+                break
+            print(f"Skipping model (over budget): {model_name}")
+        else:
+            return False
+        attempt = _Attempt(model_name, hedge, total - len(candidates) - 1)
+        print(f"Trying model ({'hedge' if hedge else 'primary'}): {attempt.model_name}")
+        live.append(attempt)
+        _hedge_pool.submit(_run_attempt, attempt, prompt, image_data, events)
+        return True
+
+    launch(False)
+    try:
+        while live:
+            waiting_for_first = winner is None and candidates
+            try:
+                attempt, kind, payload = events.get(timeout=delay if waiting_for_first else None)
+            except queue.Empty:
+                if _hedge_slots.acquire(blocking=False) and not launch(True):
+                    _hedge_slots.release()  # no model left with budget
+                continue
+
+            if winner is None:
+                if kind != "chunk":
+                    if attempt in live:
+                        live.remove(attempt)
+                    if not live and candidates:
+                        launch(False)
+                    continue
+                winner = attempt
+                outcome["model_used"] = attempt.model_name
+                for other in live:
+                    if other is not attempt:
+                        other.cancelled.set()
+                        if other.started <= attempt.started:
+                            registry.record_dropped(other.model_name, time.time() - other.started)
+                live[:] = [attempt]
+
+            if attempt is not winner:
+                continue
+            if kind == "chunk":
+                yield payload
+            else:
+                outcome["complete"] = kind == "done"
+                return
+    finally:
+        # Dropped or abandoned attempts stop at their next chunk
+        for attempt in live:
+            if attempt is not winner or not outcome.get("complete"):
+                attempt.cancelled.set()
+
+
+def _candidates(first_model=None):
+    """Models to try in order; a model already picked by the scheduler goes first."""
+    ordered = registry.ordered()
+    if first_model in ordered:
+        ordered.remove(first_model)
+        ordered.insert(0, first_model)
+    return ordered
+
+
+def _next_model(tried, rate_limiter, first_model=None):
+    """Best untried model, honoring the rate limiter's budget when one is given."""
+    if first_model is not None and first_model not in tried:
+        return first_model
+    untried = [name for name in registry.ordered() if name not in tried]
+    if rate_limiter is None or not untried:
+        return untried[0] if untried else None
+    for name in untried:
+        if rate_limiter.try_acquire(name):
+            return name
+    if first_model is not None:
+        return None  # admitted by a scheduler: fall back only where budget is free now
+    # Every remaining model is over budget: wait for the first one to free up
+    return rate_limiter.acquire_any(untried)
+
+
+def get_gemini_response(prompt: str, image_data=None, use_cache=True, hedge_delay=None, rate_limiter=None,
+                        first_model=None):
+    # Serve repeated prompts (and identical images) from the local cache
+    started = time.time()
+    cache_key = response_cache.make_key(prompt, image_data)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached:
+            _record_cache_hit(cached, started, prompt, image_data)
+            return cached
+
+    hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+    # Hedging would spend budget on parallel calls, so rate-limited callers go sequential
+    if hedge_delay and rate_limiter is None:
+        outcome = {}
+        text = "".join(_hedged_chunks(prompt, image_data, hedge_delay, outcome, first_model)).strip()
+        if outcome.get("complete") and text:
+            response_cache.put(cache_key, outcome["model_used"], text)
+            return {"model_used": outcome["model_used"], "response": text}
+        return {"model_used": None, "response": FAILURE_MESSAGE}
+
+    tried = set()
+    while True:
+        model_name = _next_model(tried, rate_limiter, first_model)
+        if model_name is None:
+            break
+        tried.add(model_name)
+        depth = len(tried) - 1
+        started = time.time()
+        try:
+            print(f"Trying model: {model_name}")
+            model = registry.get_model(model_name)
+            response = model.generate_content(_contents(prompt, image_data))
+
+            if hasattr(response, 'text') and response.text.strip():
+                registry.record_success(model_name, time.time() - started)
+                _record_attempt(model_name, "ok", started, prompt, image_data, len(response.text), depth)
+                response_cache.put(cache_key, model_name, response.text.strip())
+                return {
+                    "model_used": model_name,
+                    "response": response.text.strip()
+                }
+            registry.record_failure(model_name, "empty")
+            _record_attempt(model_name, "empty", started, prompt, image_data, depth=depth)
+        except Exception as e:
+            _record_attempt(model_name, _record_error(model_name, e), started, prompt, image_data, depth=depth)
+
+    # If none worked
+    return {
+        "model_used": None,
+        "response": FAILURE_MESSAGE
+    }
+
+
+def stream_gemini_response(prompt: str, image_data=None, use_cache=True, hedge_delay=None, first_model=None,
+                           rate_limiter=None):
+    """Yields the answer in chunks as Gemini produces them.
+
+    Falls back through the model chain like get_gemini_response, but only until
+    the first chunk has been yielded; after that a failure ends the stream.
+    `first_model` is tried before the usual order (the scheduler's pick). With a
+    `rate_limiter`, hedges and fallbacks are skipped unless its try_acquire()
+    grants budget for that model right away.
+    """
+    started = time.time()
+    cache_key = response_cache.make_key(prompt, image_data)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached:
+            _record_cache_hit(cached, started, prompt, image_data)
+            yield cached["response"]
+            return
+
+    hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+    if hedge_delay:
+        outcome = {}
+        chunks = []
+        for chunk in _hedged_chunks(prompt, image_data, hedge_delay, outcome, first_model, rate_limiter):
+            chunks.append(chunk)
+            yield chunk
+        if outcome.get("complete"):
+            response_cache.put(cache_key, outcome["model_used"], "".join(chunks).strip())
+        elif chunks:
+            yield INTERRUPTED_MESSAGE
+        else:
+            yield FAILURE_MESSAGE
+        return
+
+    for depth, model_name in enumerate(_candidates(first_model)):
+        if rate_limiter is not None and model_name != first_model and not rate_limiter.try_acquire(model_name):
+            print(f"Skipping model (over budget): {model_name}")
+            continue
+        started = time.time()
+        chunks = []
+        try:
+            print(f"Trying model (stream): {model_name}")
+            model = registry.get_model(model_name)
+            for chunk in model.generate_content(_contents(prompt, image_data), stream=True):
+                text = _chunk_text(chunk)
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            kind = _record_error(model_name, e)
+            _record_attempt(model_name, kind, started, prompt, image_data, sum(map(len, chunks)), depth)
+            if chunks:
+                yield INTERRUPTED_MESSAGE
+                return
+            continue
+
+        text = "".join(chunks)
+        if text.strip():
+            registry.record_success(model_name, time.time() - started)
+            _record_attempt(model_name, "ok", started, prompt, image_data, len(text), depth)
+            response_cache.put(cache_key, model_name, text.strip())
+            return
+        registry.record_failure(model_name, "empty")
+        _record_attempt(model_name, "empty", started, prompt, image_data, depth=depth)
+
+    # If none worked
+    yield FAILURE_MESSAGE
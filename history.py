@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+from database import (save_search, delete_search, get_search_history, get_history_page,
+                      get_search_response, search_history, HISTORY_TITLE_LENGTH)
+
+# Features shown in the sidebar history, with the page size used per feature
+HISTORY_FEATURES = ("Nutrigenie", "MetaboTrack", "RecipeMaster", "SmartShopper")
+HISTORY_PAGE_SIZE = 10
+
+_HISTORY_KEY = "search_history"
+_HISTORY_USER_KEY = "search_history_user"
+_RESPONSES_KEY = "search_responses"
+
+
+# Session-scoped history: summaries are loaded once per session, then patched in place
+# on save/delete; full responses are fetched only when an entry is opened.
+def load_history(state, user_id):
+    """Returns {feature: {"entries": [(id, title, timestamp)], "has_more": bool}}."""
+    if state.get(_HISTORY_KEY) is None or state.get(_HISTORY_USER_KEY) != user_id:
+        # Ask for one extra row per feature to learn whether "load more" is needed
+        pages = get_search_history(user_id, HISTORY_FEATURES, HISTORY_PAGE_SIZE + 1)
+        state[_HISTORY_KEY] = {
+            feature: {"entries": rows[:HISTORY_PAGE_SIZE], "has_more": len(rows) > HISTORY_PAGE_SIZE}
+            for feature, rows in pages.items()
+        }
+        state[_HISTORY_USER_KEY] = user_id
+        state[_RESPONSES_KEY] = {}
+    return state[_HISTORY_KEY]
+
+
+def load_more(state, user_id, feature):
+    page = load_history(state, user_id)[feature]
+    last = page["entries"][-1] if page["entries"] else None
+    rows = get_history_page(user_id, feature, (last[2], last[0]) if last else None, HISTORY_PAGE_SIZE + 1)
+    page["entries"].extend(rows[:HISTORY_PAGE_SIZE])
+    page["has_more"] = len(rows) > HISTORY_PAGE_SIZE
+
+
+def get_response(state, search_id):
+    responses = state.setdefault(_RESPONSES_KEY, {})
+    if search_id not in responses:
+        responses[search_id] = get_search_response(search_id)
+    return responses[search_id]
+
+
+def find_searches(user_id, text, features=None):
+    """Full-text search over the sidebar features: [(id, feature, title, snippet, timestamp)]."""
+    return search_history(user_id, text, features or HISTORY_FEATURES)
+
+
+def record_search(state, user_id, feature, query, response, template_id=None, inputs=None):
+    search_id = save_search(user_id, feature, query, response, template_id, inputs)
+    history = state.get(_HISTORY_KEY)
+    if history is not None and feature in history:
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        history[feature]["entries"].insert(0, (search_id, query[:HISTORY_TITLE_LENGTH], timestamp))
+        state.setdefault(_RESPONSES_KEY, {})[search_id] = response
+    return search_id
+
+
+def forget_search(state, feature, search_id):
+    delete_search(search_id)
+    history = state.get(_HISTORY_KEY)
+    if history is not None and feature in history:
+        page = history[feature]
+        page["entries"] = [entry for entry in page["entries"] if entry[0] != search_id]
+    state.get(_RESPONSES_KEY, {}).pop(search_id, None)
+
+
+def clear_history(state):
+    state[_HISTORY_KEY] = None
+    state[_HISTORY_USER_KEY] = None
+    state[_RESPONSES_KEY] = {}
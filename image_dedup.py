@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from database import get_connection
+
+# Near-duplicate matching settings (override through environment variables)
+DEDUP_THRESHOLD = int(os.getenv("NUTRIGENIE_DEDUP_THRESHOLD", 8))        # max differing bits of 64
+DEDUP_MAX_ENTRIES = int(os.getenv("NUTRIGENIE_DEDUP_MAX_ENTRIES", 2000))
+
+_SIGN_BIT = 1 << 63
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= _SIGN_BIT else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+# Perceptual hashes over a downscaled grayscale copy
+def dhash(image, size=8):
+    """Difference hash: one bit per horizontally adjacent pixel pair."""
+    from PIL import Image
+
+    small = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return bits
+
+
+def ahash(image, size=8):
+    """Average hash: one bit per pixel brighter than the mean."""
+    from PIL import Image
+
+    pixels = list(image.convert("L").resize((size, size), Image.LANCZOS).getdata())
+    mean = sum(pixels) / len(pixels)
+    bits = 0
+    for pixel in pixels:
+        bits = (bits << 1) | (pixel > mean)
+    return bits
+
+
+class ImageIndex:
+    """Persisted, size-bounded index of analysed meal photos keyed by perceptual hash.
+
+    Both hashes must be within `threshold` bits for a match, which keeps dHash's
+    tolerance to re-shoots while aHash filters out structurally similar but
+    different plates. The table lives in users.db (migration 11).
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, max_entries=DEDUP_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None  # {id: (dhash, ahash)}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _load(self):
+        # Called with the lock held: reads the stored hashes once per process
+        if self._entries is None:
+            with get_connection() as conn:
+                rows = conn.execute("SELECT id, dhash, ahash FROM image_analyses").fetchall()
+            self._entries = {row[0]: (_to_unsigned(row[1]), _to_unsigned(row[2])) for row in rows}
+
+    def _closest(self, d, a):
+        best_id, best_distance = None, None
+        for entry_id, (entry_d, entry_a) in self._entries.items():
+            distance = (entry_d ^ d).bit_count()
+            if distance <= self.threshold and (entry_a ^ a).bit_count() <= self.threshold:
+                if best_distance is None or distance < best_distance:
+                    best_id, best_distance = entry_id, distance
+        return best_id, best_distance
+
+    def lookup(self, image):
+        """Returns (response, distance) for the closest stored photo, or None."""
+        d, a = dhash(image), ahash(image)
+        with self._lock:
+            self._load()
+            entry_id, distance = self._closest(d, a)
+            if entry_id is None:
+                self._stats["misses"] += 1
+                return None
+            with get_connection() as conn:
+                conn.execute("UPDATE image_analyses SET last_used=? WHERE id=?", (time.time(), entry_id))
+                response = conn.execute("SELECT response FROM image_analyses WHERE id=?", (entry_id,)).fetchone()[0]
+            self._stats["hits"] += 1
+        return response, distance
+
+    def add(self, image, response):
+        d, a = dhash(image), ahash(image)
+        now = time.time()
+        with self._lock:
+            self._load()
+            with get_connection() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO image_analyses (dhash, ahash, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (_to_signed(d), _to_signed(a), response, now, now))
+                self._entries[cursor.lastrowid] = (d, a)
+                excess = len(self._entries) - self.max_entries
+                if excess > 0:
+                    stale = conn.execute("SELECT id FROM image_analyses ORDER BY last_used ASC LIMIT ?",
+                                         (excess,)).fetchall()
+                    conn.executemany("DELETE FROM image_analyses WHERE id=?", stale)
+                    for (entry_id,) in stale:
+                        self._entries.pop(entry_id, None)
+                    self._stats["evictions"] += len(stale)
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            result = dict(self._stats, entries=len(self._entries))
+        lookups = result["hits"] + result["misses"]
+        result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+        return result
+
+
+# Process-wide index shared by every session
+meal_index = ImageIndex()
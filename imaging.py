@@ -0,0 +1,81 @@
+import io
+import os
+import time
+
+# Meal photo settings (override through environment variables)
+IMAGE_MAX_EDGE = int(os.getenv("NUTRIGENIE_IMAGE_MAX_EDGE", 1024))
+JPEG_QUALITY = int(os.getenv("NUTRIGENIE_JPEG_QUALITY", 80))
+ORIENTATION_TAG = 0x0112
+
+
+class PreparedImage:
+    """A decoded, upright, resized meal photo plus the bytes that go to Gemini."""
+
+    def __init__(self, image, data, mime_type, original_bytes, elapsed):
+        self.image = image
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.elapsed = elapsed
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+    def as_image_data(self):
+        """The list-of-parts shape get_gemini_response expects."""
+        return [{"mime_type": self.mime_type, "data": self.data}]
+
+    def summary(self):
+        return (f"Image optimized: {self.original_bytes / 1024:.0f} KB → {len(self.data) / 1024:.0f} KB "
+                f"({max(self.bytes_saved, 0) / 1024:.0f} KB saved) in {self.elapsed * 1000:.0f} ms")
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _flatten(image, Image):
+    # Gemini doesn't need the transparency; white behind it keeps the food readable
+    rgba = image.convert("RGBA")
+    background = Image.new("RGB", rgba.size, "white")
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+# Preprocess Image
+def preprocess_image(raw, max_edge=None, quality=None):
+    """Applies EXIF orientation, caps the longest edge and re-encodes the photo once.
+
+    Everything is sent as JPEG, transparent images flattened onto white. If the
+    photo needed no rotation or resizing and re-encoding would only make it
+    larger, the original bytes are kept.
+    """
+    max_edge = max_edge or IMAGE_MAX_EDGE
+    quality = quality or JPEG_QUALITY
+    started = time.perf_counter()
+
+    from PIL import Image, ImageOps  # imported on first use to keep app start-up light
+
+    source = Image.open(io.BytesIO(raw))
+    source_mime = Image.MIME.get(source.format, "image/jpeg")
+    source_size = source.size
+    # exif_transpose always returns a copy, so look at the tag itself to know if it rotated
+    rotated = source.getexif().get(ORIENTATION_TAG, 1) != 1
+    if source.format == "JPEG":
+        # Let the JPEG decoder scale down by 2/4/8 while decoding instead of afterwards
+        source.draft("RGB", (max_edge, max_edge))
+    image = ImageOps.exif_transpose(source)
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    changed = rotated or image.size != source_size  # draft() decoding smaller counts as a resize
+
+    image = _flatten(image, Image) if _has_alpha(image) else image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    data, mime_type = buffer.getvalue(), "image/jpeg"
+
+    if not changed and len(data) >= len(raw):
+        data, mime_type = raw, source_mime
+
+    return PreparedImage(image, data, mime_type, len(raw), time.perf_counter() - started)
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import response_cache
+from gemini import FAILURE_MESSAGE, stream_gemini_response
+
+# Background job settings (override through environment variables)
+JOB_WORKERS = int(os.getenv("NUTRIGENIE_JOB_WORKERS", 16))
+JOB_PER_USER_LIMIT = int(os.getenv("NUTRIGENIE_JOB_PER_USER", 2))   # unfinished jobs one user may have
+JOB_TTL_SECONDS = int(os.getenv("NUTRIGENIE_JOB_TTL", 10 * 60))     # finished jobs stay fetchable this long
+JOB_POLL_SECONDS = float(os.getenv("NUTRIGENIE_JOB_POLL", 0.5))
+
+BUSY_MESSAGE = "⏳ NutriGenie is very busy right now. Please try again in a minute."
+
+
+class JobLimitError(Exception):
+    pass
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class Job:
+    """One Gemini call running in the background, shared by everyone who asked for it."""
+
+    def __init__(self, key, prompt, image_data, hedge_delay, feature):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.prompt = prompt
+        self.image_data = image_data
+        self.hedge_delay = hedge_delay
+        self.feature = feature
+        self.owners = set()
+        self.status = "queued"          # queued, running, done, failed or cancelled
+        self.chunks = []
+        self.model_used = None
+        self.error = None
+        self.queue_position = None
+        self.eta = None
+        self.cancelled = threading.Event()
+        self.created = time.time()
+        self.finished_at = None
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+
+class JobManager:
+    """Process-wide Gemini job runner with single-flight deduplication.
+
+    A prompt (plus images) that is already in flight is not sent again: the new
+    caller is attached to the running job. Jobs outlive Streamlit reruns; the UI
+    keeps only the job id and polls. A job is only stopped once every owner has
+    cancelled it.
+    """
+
+    def __init__(self, scheduler=None, workers=JOB_WORKERS, per_user_limit=JOB_PER_USER_LIMIT, ttl=JOB_TTL_SECONDS):
+        self.scheduler = scheduler
+        self.per_user_limit = per_user_limit
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-job")
+        self._lock = threading.Lock()
+        self._jobs = {}       # {job id: Job}
+        self._inflight = {}   # {cache key: unfinished Job}
+        self._stats = {"submitted": 0, "coalesced": 0, "cached": 0, "cancelled": 0, "rejected": 0}
+
+    def _expire(self, now):
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.ttl]:
+            del self._jobs[job_id]
+
+    def _active_jobs(self, user):
+        return sum(1 for job in self._jobs.values() if user in job.owners and not job.finished)
+
+    def submit(self, user, prompt, image_data=None, hedge_delay=None):
+        """Returns the job answering this prompt, starting one only if none is in flight."""
+        key = response_cache.make_key(prompt, image_data)
+        with self._lock:
+            self._expire(time.time())
+            job = self._inflight.get(key)
+            if job is not None and user in job.owners:
+                return job  # a double click or a rerun re-submitting the same request
+            if self._active_jobs(user) >= self.per_user_limit:
+                self._stats["rejected"] += 1
+                raise JobLimitError(f"You already have {self.per_user_limit} requests running. "
+                                    "Please wait for one to finish.")
+            if job is not None:
+                job.owners.add(user)
+                self._stats["coalesced"] += 1
+                return job
+            job = Job(key, prompt, image_data, hedge_delay, metrics.current_feature())
+            job.owners.add(user)
+            self._jobs[job.id] = job
+            self._stats["submitted"] += 1
+
+            cached = response_cache.get(key)
+            if cached:
+                job.chunks.append(cached["response"])
+                job.model_used = cached["model_used"]
+                self._finish(job, "done")
+                self._stats["cached"] += 1
+                return job
+            self._inflight[key] = job
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id, user):
+        """Detaches the user; the upstream call stops when nobody is left waiting."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            job.owners.discard(user)
+            if not job.owners:
+                job.cancelled.set()
+                self._stats["cancelled"] += 1
+
+    def _finish(self, job, status, error=None):
+        # Called with the lock held
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def _run(self, job):
+        metrics.set_feature(job.feature)
+        status, error = "done", None
+        try:
+            model = None
+            if self.scheduler is not None:
+                model = self.scheduler.admit(next(iter(job.owners), job.id), lambda position, eta: self._waiting(
+                    job, position, eta))
+                if model is None:
+                    raise RuntimeError(BUSY_MESSAGE)
+            job.status = "running"
+            job.queue_position = job.eta = None
+            # The scheduler granted one token for `model`: hedges and fallbacks must take their own
+            stream = stream_gemini_response(job.prompt, job.image_data, use_cache=False,
+                                            hedge_delay=job.hedge_delay, first_model=model,
+                                            rate_limiter=self.scheduler)
+            try:
+                for chunk in stream:
+                    if job.cancelled.is_set():
+                        raise _Cancelled()
+                    job.chunks.append(chunk)
+            finally:
+                stream.close()  # drops any hedged attempts still running
+        except _Cancelled:
+            status = "cancelled"
+        except Exception as e:
+            print(f"[Job Error] - {e}")
+            status, error = "failed", str(e) or FAILURE_MESSAGE
+        with self._lock:
+            self._finish(job, status, error)
+
+    def _waiting(self, job, position, eta):
+        if job.cancelled.is_set():
+            raise _Cancelled()
+        job.queue_position = position
+        job.eta = eta
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, running=len(self._inflight), stored=len(self._jobs))
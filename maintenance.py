@@ -0,0 +1,260 @@
+"""History retention, archival and compaction for users.db.
+
+Keeps at most KEEP_PER_FEATURE searches per user and feature (override one
+feature with NUTRIGENIE_KEEP_<FEATURE>, e.g. NUTRIGENIE_KEEP_RECIPEMASTER) and
+KEEP_PER_USER overall. Older searches are appended to gzipped NDJSON files in
+ARCHIVE_DIR, then deleted in chunks so no single transaction blocks the app
+for long. Old metrics and expired sessions are dropped, the freed pages are
+returned with an incremental vacuum, and ANALYZE refreshes the planner stats.
+
+The first CLI run switches users.db to incremental auto_vacuum, which takes one
+full VACUUM; the in-app thread (opt-in, NUTRIGENIE_MAINTENANCE_HOURS) never
+rewrites the whole file while users are waiting on it.
+
+    python maintenance.py --dry-run        # report what would be removed
+    python maintenance.py                  # archive, delete and compact
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Run as a CLI: pick up .env before the project modules read their NUTRIGENIE_* settings
+    load_dotenv()
+
+import database
+from database import delete_expired_sessions, get_connection, init_db, unindex_searches, unpack_text
+from history import HISTORY_FEATURES
+
+# Maintenance settings (override through environment variables; 0 means no limit)
+KEEP_PER_FEATURE = int(os.getenv("NUTRIGENIE_KEEP_PER_FEATURE", 200))
+KEEP_PER_USER = int(os.getenv("NUTRIGENIE_KEEP_PER_USER", 600))
+FEATURE_KEEP = {feature: int(os.getenv(f"NUTRIGENIE_KEEP_{feature.upper()}", KEEP_PER_FEATURE))
+                for feature in HISTORY_FEATURES}
+METRICS_RETENTION_DAYS = int(os.getenv("NUTRIGENIE_METRICS_RETENTION_DAYS", 30))
+ARCHIVE_DIR = os.getenv("NUTRIGENIE_ARCHIVE_DIR", "archive")
+DELETE_CHUNK = int(os.getenv("NUTRIGENIE_DELETE_CHUNK", 500))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("NUTRIGENIE_MAINTENANCE_HOURS", 0))   # in-app thread; 0 = off (use the CLI)
+
+_ROW_BYTES = "length(query) + length(response) + coalesce(length(inputs), 0)"
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+# Retention
+def expired_searches(feature_caps=FEATURE_KEEP, default_cap=KEEP_PER_FEATURE, keep_per_user=KEEP_PER_USER):
+    """Ids of searches beyond the caps, oldest first: [(id, feature)].
+
+    `feature_caps` maps feature -> searches kept per user; other features keep `default_cap`.
+    """
+    caps = dict(feature_caps)
+    cap_rows = " UNION ALL ".join(["SELECT ?, ?"] * len(caps)) or "SELECT NULL, NULL"
+    sql = f"""
+        WITH caps(feature, keep) AS ({cap_rows}),
+        ranked AS (
+            SELECT id, feature,
+                   ROW_NUMBER() OVER (PARTITION BY user_id, feature ORDER BY timestamp DESC, id DESC) AS feature_rank,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC, id DESC) AS user_rank
+            FROM searches
+        )
+        SELECT r.id, r.feature FROM ranked r LEFT JOIN caps c ON c.feature = r.feature
+        WHERE (COALESCE(c.keep, ?) > 0 AND r.feature_rank > COALESCE(c.keep, ?))
+           OR (? > 0 AND r.user_rank > ?)
+        ORDER BY r.id
+    """
+    params = [value for item in caps.items() for value in item]
+    params += [default_cap, default_cap, keep_per_user, keep_per_user]
+    with get_connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _archive_path(archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    return os.path.join(archive_dir, time.strftime("searches-%Y%m%d-%H%M%S.ndjson.gz"))
+
+
+def prune_searches(ids, archive_dir=ARCHIVE_DIR, dry_run=False, chunk_size=DELETE_CHUNK):
+    """Archives and deletes the given searches in chunks; returns (rows, bytes, archive path)."""
+    rows = stored_bytes = 0
+    path = None
+    archive = None
+    try:
+        for chunk in _chunks(ids, chunk_size):
+            marks = ",".join("?" * len(chunk))
+            with get_connection() as conn:
+                if dry_run:
+                    count, size = conn.execute(
+                        f"SELECT count(*), coalesce(sum({_ROW_BYTES}), 0) FROM searches WHERE id IN ({marks})",
+                        chunk).fetchone()
+                    rows += count
+                    stored_bytes += size
+                    continue
+                records = conn.execute(
+                    f"SELECT id, user_id, feature, query, response, timestamp, template_id, inputs, {_ROW_BYTES} "
+                    f"FROM searches WHERE id IN ({marks}) ORDER BY id", chunk).fetchall()
+                if archive_dir and records:
+                    if archive is None:
+                        path = _archive_path(archive_dir)
+                        archive = gzip.open(path, "at", encoding="utf-8")
+                    for search_id, user_id, feature, query, response, timestamp, template_id, inputs, _ in records:
+                        archive.write(json.dumps({
+                            "id": search_id, "user_id": user_id, "feature": feature, "query": query,
+                            "response": unpack_text(response), "timestamp": timestamp,
+                            "template_id": template_id, "inputs": json.loads(inputs) if inputs else None,
+                        }) + "\n")
+                    archive.flush()  # archived before the delete commits
+                unindex_searches(conn, [(record[0], record[3], record[4]) for record in records])
+                conn.execute(f"DELETE FROM searches WHERE id IN ({marks})", chunk)
+                rows += len(records)
+                stored_bytes += sum(record[-1] for record in records)
+    finally:
+        if archive is not None:
+            archive.close()
+    return rows, stored_bytes, path
+
+
+def prune_metrics(days=METRICS_RETENTION_DAYS, dry_run=False, chunk_size=DELETE_CHUNK):
+    """Drops metrics rows older than `days`; returns the number of rows."""
+    if days <= 0:
+        return 0
+    cutoff = time.time() - days * 24 * 60 * 60
+    if dry_run:
+        with get_connection() as conn:
+            return conn.execute("SELECT count(*) FROM metrics WHERE ts < ?", (cutoff,)).fetchone()[0]
+    total = 0
+    while True:
+        with get_connection() as conn:
+            deleted = conn.execute("DELETE FROM metrics WHERE id IN (SELECT id FROM metrics WHERE ts < ? LIMIT ?)",
+                                   (cutoff, chunk_size)).rowcount
+        total += deleted
+        if deleted < chunk_size:
+            return total
+
+
+# Compaction
+def _free_bytes(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+
+
+def _file_bytes():
+    # Under WAL recent pages live in users.db-wal until a checkpoint
+    return sum(os.path.getsize(path) for path in (database.DB_PATH, database.DB_PATH + "-wal")
+               if os.path.exists(path))
+
+
+def compact(dry_run=False, full_vacuum=False):
+    """Returns free pages to the filesystem and refreshes planner statistics; returns bytes reclaimed.
+
+    Switching to incremental auto_vacuum needs one full VACUUM, which only runs
+    with `full_vacuum` (the CLI); until then free pages are left for reuse.
+    """
+    with get_connection() as conn:
+        free = _free_bytes(conn)
+        if dry_run:
+            return free
+        before = _file_bytes()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            conn.execute("PRAGMA incremental_vacuum")
+        elif full_vacuum:
+            # auto_vacuum only changes with a full VACUUM: done once, later runs are incremental
+            print("[Maintenance] Switching users.db to incremental auto_vacuum (one full VACUUM)")
+            conn.commit()
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            print("[Maintenance] users.db is not on incremental auto_vacuum yet; run `python maintenance.py` once")
+        conn.execute("ANALYZE")
+    # A checkpoint moves the vacuumed pages out of the WAL so the file can shrink
+    with get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return max(0, before - _file_bytes())
+
+
+# One maintenance pass
+def _expired_sessions(dry_run):
+    now = time.time()
+    if dry_run:
+        with get_connection() as conn:
+            return conn.execute("SELECT count(*) FROM sessions WHERE expires_at <= ?", (now,)).fetchone()[0]
+    return delete_expired_sessions(now)
+
+
+def run(dry_run=False, feature_caps=FEATURE_KEEP, default_cap=KEEP_PER_FEATURE, keep_per_user=KEEP_PER_USER,
+        archive_dir=ARCHIVE_DIR, vacuum=True, full_vacuum=False):
+    """Applies retention and compaction; returns a report dict (nothing changes with dry_run)."""
+    started = time.perf_counter()
+    expired = expired_searches(feature_caps, default_cap, keep_per_user)
+    by_feature = {}
+    for _, feature in expired:
+        by_feature[feature] = by_feature.get(feature, 0) + 1
+    rows, stored_bytes, archive = prune_searches([search_id for search_id, _ in expired], archive_dir, dry_run)
+    report = {
+        "dry_run": dry_run,
+        "searches_removed": rows,
+        "searches_by_feature": by_feature,
+        "search_bytes": stored_bytes,
+        "archive": archive,
+        "metrics_removed": prune_metrics(dry_run=dry_run),
+        "sessions_removed": _expired_sessions(dry_run),
+    }
+    if vacuum:
+        report["bytes_reclaimed" if not dry_run else "free_bytes"] = compact(dry_run, full_vacuum)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def _maintenance_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            print(f"[Maintenance] {json.dumps(run())}")
+        except Exception as e:
+            print(f"[Maintenance Error] - {e}")
+
+
+def start_maintenance(interval_hours=MAINTENANCE_INTERVAL_HOURS):
+    """Starts the background maintenance thread once per process (off unless an interval is set)."""
+    global _thread
+    with _thread_lock:
+        if interval_hours <= 0 or _thread is not None:
+            return
+        _thread = threading.Thread(target=_maintenance_loop, args=(interval_hours * 60 * 60,),
+                                   name="maintenance", daemon=True)
+        _thread.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    parser.add_argument("--keep-per-feature", type=int, help="searches kept per user and feature")
+    parser.add_argument("--keep-per-user", type=int, default=KEEP_PER_USER, help="searches kept per user")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--no-archive", action="store_true", help="delete without writing an archive")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip vacuum and ANALYZE")
+    args = parser.parse_args()
+
+    init_db()
+    feature_caps, default_cap = FEATURE_KEEP, KEEP_PER_FEATURE
+    if args.keep_per_feature is not None:
+        feature_caps, default_cap = {}, args.keep_per_feature
+    report = run(args.dry_run, feature_caps, default_cap, args.keep_per_user,
+                 None if args.no_archive else args.archive_dir, not args.no_vacuum, full_vacuum=True)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
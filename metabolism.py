@@ -0,0 +1,81 @@
+from collections import namedtuple
+from datetime import datetime
+
+# Activity multipliers (Harris-Benedict), keyed by the MetaboTrack activity options
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary (Little or no exercise)": 1.2,
+    "Lightly active (Exercise 1-3 days per week)": 1.375,
+    "Moderately active (Exercise 3-5 days per week)": 1.55,
+    "Very active (Daily intense exercise)": 1.725,
+}
+
+# Fasting states by hours since the last meal
+FAT_STORAGE = "Fat Storage Mode"          # fed / absorptive, under 4 h
+BALANCED = "Balanced Metabolism"          # post-absorptive, 4-12 h
+FAT_BURNING = "Fat Burning Mode"          # fasted, 12 h and over
+
+MetabolismResult = namedtuple(
+    "MetabolismResult", ["score", "fasting_state", "hours_since_meal", "activity_multiplier"]
+)
+
+
+def activity_multiplier(activity_level):
+    return ACTIVITY_MULTIPLIERS.get(activity_level, ACTIVITY_MULTIPLIERS["Sedentary (Little or no exercise)"])
+
+
+def hours_since(last_meal, now=None):
+    now = now or datetime.now()
+    return max((now - last_meal).total_seconds() / 3600, 0.0)
+
+
+def fasting_state(hours):
+    if hours < 4:
+        return FAT_STORAGE
+    if hours < 12:
+        return BALANCED
+    return FAT_BURNING
+
+
+def _activity_points(multiplier):
+    # 0-35: sedentary scores 0, very active scores 35
+    return 35 * (multiplier - 1.2) / (1.725 - 1.2)
+
+
+def _sleep_points(sleep_hours):
+    # 0-35: full marks for 7-9 hours, minus 10 per hour outside that band
+    if 7 <= sleep_hours <= 9:
+        return 35
+    gap = 7 - sleep_hours if sleep_hours < 7 else sleep_hours - 9
+    return max(35 - 10 * gap, 0)
+
+
+def _fasting_points(hours):
+    # 0-30: a 5-16 hour gap scores best; right after a meal or a prolonged fast scores less
+    if hours < 3:
+        return 15
+    if hours < 5:
+        return 22
+    if hours <= 16:
+        return 30
+    return max(30 - 2 * (hours - 16), 10)
+
+
+def analyze(activity_level, sleep_hours, last_meal, now=None):
+    """Reproducible 0-100 metabolism score and fasting state for one set of inputs."""
+    multiplier = activity_multiplier(activity_level)
+    hours = hours_since(last_meal, now)
+    score = _activity_points(multiplier) + _sleep_points(sleep_hours) + _fasting_points(hours)
+    return MetabolismResult(int(round(min(max(score, 0), 100))), fasting_state(hours), round(hours, 1), multiplier)
+
+
+def analyze_batch(rows, now=None):
+    """Scores many (activity_level, sleep_hours, last_meal) tuples against one shared `now`."""
+    now = now or datetime.now()
+    return [analyze(activity_level, sleep_hours, last_meal, now) for activity_level, sleep_hours, last_meal in rows]
+
+
+def summary(result):
+    """Plain-text report used in fast mode and saved to history."""
+    return (f"Metabolism Score: {result.score}/100\n\n"
+            f"State: {result.fasting_state} ({result.hours_since_meal} hours since your last meal)\n\n"
+            f"Activity multiplier: {result.activity_multiplier}")
@@ -0,0 +1,185 @@
+"""In-process timings and counters for Gemini calls, database calls, password hashing and reruns.
+
+Events land in a fixed-size ring buffer that the admin tab reads, and a
+background thread copies them to the metrics table every FLUSH_INTERVAL
+seconds. The Prometheus text export can be produced from either:
+
+    python metrics.py            # from the metrics table of NUTRIGENIE_DB_PATH
+"""
+import contextvars
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+# Metrics settings (override through environment variables)
+RING_SIZE = int(os.getenv("NUTRIGENIE_METRICS_RING", 10000))
+FLUSH_INTERVAL = int(os.getenv("NUTRIGENIE_METRICS_FLUSH", 30))   # seconds; 0 keeps metrics in memory only
+QUANTILES = (0.5, 0.95, 0.99)
+
+Event = namedtuple("Event", ["ts", "kind", "name", "feature", "outcome", "latency", "attrs"])
+
+_events = deque(maxlen=RING_SIZE)
+_unflushed = deque(maxlen=RING_SIZE)
+_flusher = None
+_flusher_lock = threading.Lock()
+
+# Feature the current script run is working on, attached to every event it records
+_feature = contextvars.ContextVar("nutrigenie_feature", default=None)
+
+
+def set_feature(name):
+    _feature.set(name)
+
+
+def current_feature():
+    return _feature.get()
+
+
+def record(kind, name, latency, outcome="ok", feature=None, **attrs):
+    """Adds one event; `kind` is "llm", "db", "hash", "rerun" or "startup"."""
+    event = Event(time.time(), kind, name, feature or _feature.get(), outcome, latency, attrs)
+    _events.append(event)
+    if FLUSH_INTERVAL > 0:
+        _unflushed.append(event)
+        if _flusher is None:
+            _start_flusher()
+
+
+def instrumented(kind):
+    """Decorator that records the call time and outcome of a function."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                record(kind, func.__name__, time.perf_counter() - started, outcome)
+        return wrapper
+    return decorate
+
+
+def events(kind=None, since=None):
+    """Snapshot of the ring buffer, optionally filtered by kind and start time."""
+    return [e for e in list(_events) if (kind is None or e.kind == kind) and (since is None or e.ts >= since)]
+
+
+# Flush to the metrics table
+def flush():
+    """Writes buffered events to the database; returns how many were written."""
+    from database import get_connection
+
+    batch = []
+    while _unflushed:
+        try:
+            batch.append(_unflushed.popleft())
+        except IndexError:
+            break
+    if not batch:
+        return 0
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO metrics (ts, kind, name, feature, outcome, latency, attrs) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(e.ts, e.kind, e.name, e.feature, e.outcome, e.latency, json.dumps(e.attrs) if e.attrs else None)
+             for e in batch])
+    return len(batch)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            print(f"[Metrics Flush Error] - {e}")
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+
+
+def load_events(since=None):
+    """Events from the metrics table (for reports across restarts)."""
+    from database import get_connection
+
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT ts, kind, name, feature, outcome, latency, attrs FROM metrics WHERE ts >= ? ORDER BY ts",
+            (since or 0,)).fetchall()
+    return [Event(*row[:6], json.loads(row[6]) if row[6] else {}) for row in rows]
+
+
+# Summaries
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(0, math.ceil(pct * len(values)) - 1)]
+
+
+def summarize(event_list, key):
+    """Rows of count, error rate and latency quantiles grouped by `key(event)`."""
+    groups = {}
+    for event in event_list:
+        groups.setdefault(key(event), []).append(event)
+    rows = []
+    for group, items in sorted(groups.items(), key=lambda item: str(item[0])):
+        latencies = [e.latency for e in items]
+        errors = sum(1 for e in items if e.outcome not in ("ok", "cache_hit"))
+        row = {"group": group, "count": len(items), "error_rate": round(errors / len(items), 3)}
+        for q in QUANTILES:
+            row[f"p{int(q * 100)}_ms"] = round(percentile(latencies, q) * 1000, 1)
+        rows.append(row)
+    return rows
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels.items()) + "}"
+
+
+def prometheus(event_list=None):
+    """Prometheus text exposition of the given events (default: the ring buffer)."""
+    event_list = events() if event_list is None else event_list
+    metric_names = {
+        "llm": ("nutrigenie_llm_attempt", "model", "Gemini attempts by model"),
+        "db": ("nutrigenie_db_call", "function", "database.py calls by function"),
+        "hash": ("nutrigenie_password_hash", "function", "bcrypt hashing pool calls by function"),
+        "rerun": ("nutrigenie_rerun", "script", "Full Streamlit script runs"),
+        "startup": ("nutrigenie_startup_step", "step", "One-time process initialization steps"),
+    }
+    lines = []
+    for kind, (metric, label, help_text) in metric_names.items():
+        items = [e for e in event_list if e.kind == kind]
+        lines.append(f"# HELP {metric}_total {help_text}")
+        lines.append(f"# TYPE {metric}_total counter")
+        counts = {}
+        for e in items:
+            counts[(e.name, e.outcome)] = counts.get((e.name, e.outcome), 0) + 1
+        for (name, outcome), count in sorted(counts.items()):
+            lines.append(f"{metric}_total{_labels(**{label: name, 'outcome': outcome})} {count}")
+        lines.append(f"# HELP {metric}_seconds {help_text}, latency")
+        lines.append(f"# TYPE {metric}_seconds summary")
+        by_name = {}
+        for e in items:
+            by_name.setdefault(e.name, []).append(e.latency)
+        for name, latencies in sorted(by_name.items()):
+            for q in QUANTILES:
+                lines.append(f"{metric}_seconds{_labels(**{label: name, 'quantile': q})} "
+                             f"{percentile(latencies, q):.6f}")
+            lines.append(f"{metric}_seconds_sum{_labels(**{label: name})} {sum(latencies):.6f}")
+            lines.append(f"{metric}_seconds_count{_labels(**{label: name})} {len(latencies)}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    print(prometheus(load_events()), end="")
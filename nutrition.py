@@ -0,0 +1,93 @@
+import re
+
+# Parse the calorie tracker's fixed "Calories / Protein / Carbs / Fats ... Total X: N" layout
+NUTRIENTS = ("calories", "protein", "carbs", "fats")
+
+_AMOUNT = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"   # "1,250" as well as "1250" or "12.5"
+_NUMBER = r"~?\s*" + _AMOUNT + r"(?:\s*(?:-|–|to)\s*" + _AMOUNT + r")?"
+_TOTAL = re.compile(r"total\s+(calories|protein|carbs|fats?)\s*[:\-–]?\s*" + _NUMBER, re.IGNORECASE)
+_SECTION = re.compile(r"^(calories|protein|carbs|fats?)\s*:?\s*$", re.IGNORECASE)
+_ITEM = re.compile(r"^\d+\s*[.)]\s*(.+?)\s*(?:-|–|:)\s*" + _NUMBER, re.IGNORECASE)
+# Serving details that vary between sections: "Rice (1 cup)", "1 cup of rice", "Rice, 200 g"
+_UNITS = r"(?:g|grams?|kg|mg|ml|l|oz|ounces?|lbs?|cups?|tbsp|tsp|tablespoons?|teaspoons?|slices?|pieces?|bowls?|servings?|plates?|glass(?:es)?|large|medium|small)"
+_SERVING = re.compile(r"\([^)]*\)|\[[^\]]*\]|,.*$|^[\d./½¼¾]+(?:\s*" + _UNITS + r"\b\.?)?\s+(?:of\s+)?",
+                      re.IGNORECASE)
+
+
+class FoodItem:
+    __slots__ = ("name", "calories", "protein", "carbs", "fats")
+
+    def __init__(self, name, calories=0.0, protein=0.0, carbs=0.0, fats=0.0):
+        self.name = name
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fats = fats
+
+    def as_tuple(self):
+        return (self.name, self.calories, self.protein, self.carbs, self.fats)
+
+
+class MealRecord:
+    """Totals for one analysed meal plus its per-item breakdown."""
+
+    __slots__ = ("calories", "protein", "carbs", "fats", "items")
+
+    def __init__(self, calories, protein, carbs, fats, items=()):
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fats = fats
+        self.items = tuple(items)
+
+    def __repr__(self):
+        return (f"MealRecord(calories={self.calories}, protein={self.protein}, "
+                f"carbs={self.carbs}, fats={self.fats}, items={len(self.items)})")
+
+
+def _value(low, high):
+    # Ranges such as "250-300" count as their midpoint
+    low = float(low.replace(",", ""))
+    return (low + float(high.replace(",", ""))) / 2 if high else low
+
+
+def _item_name(text):
+    """Key for an item, so "Rice (1 cup)" and "Rice" in another section are the same food."""
+    return " ".join(_SERVING.sub(" ", text).split()).lower() or text.strip().lower()
+
+
+def _nutrient(word):
+    word = word.lower()
+    return "fats" if word.startswith("fat") else word
+
+
+def parse_nutrition(text):
+    """Turns a calorie-analysis answer into a MealRecord, or None if it has no calories."""
+    totals = {}
+    items = {}
+    section = None
+    for raw_line in text.splitlines():
+        line = raw_line.replace("*", "").replace("#", "").strip()
+        if not line or line.startswith("--"):
+            continue
+        total = _TOTAL.search(line)
+        if total:
+            totals[_nutrient(total.group(1))] = _value(total.group(2), total.group(3))
+            continue
+        header = _SECTION.match(line)
+        if header:
+            section = _nutrient(header.group(1))
+            continue
+        item = _ITEM.match(line)
+        if item and section:
+            name = _item_name(item.group(1))
+            food = items.setdefault(name, FoodItem(name))
+            setattr(food, section, _value(item.group(2), item.group(3)))
+
+    # Fall back to summing the items when the model skipped a total
+    for nutrient in NUTRIENTS:
+        if nutrient not in totals and items:
+            totals[nutrient] = sum(getattr(food, nutrient) for food in items.values())
+    if not totals.get("calories"):
+        return None
+    return MealRecord(*(totals.get(nutrient, 0.0) for nutrient in NUTRIENTS), items=items.values())
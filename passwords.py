@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from metrics import instrumented
+
+# Password hashing settings (override through environment variables)
+BCRYPT_ROUNDS = int(os.getenv("NUTRIGENIE_BCRYPT_ROUNDS", 12))   # work factor; each +1 doubles the cost
+HASH_WORKERS = int(os.getenv("NUTRIGENIE_HASH_WORKERS", max(1, min(4, (os.cpu_count() or 2) // 2))))
+HASH_MAX_PENDING = HASH_WORKERS * 4   # callers beyond this wait before queueing more work
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+
+def _get_pool():
+    """bcrypt runs in worker processes so a login storm can't stall the script threads."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a multithreaded Streamlit server is not safe
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _call(func, *args):
+    with _pending:
+        return _get_pool().submit(func, *args).result()
+
+
+@instrumented("hash")
+def hash_password(password):
+    return _call(bcrypt.hashpw, password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+
+
+@instrumented("hash")
+def check_password(password, hashed):
+    if isinstance(hashed, str):
+        hashed = hashed.encode()
+    return _call(bcrypt.checkpw, password.encode(), hashed)
+
+
+def needs_rehash(hashed):
+    """True when the stored hash was made with a different work factor than BCRYPT_ROUNDS."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode()
+    try:
+        return int(hashed.split(b"$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
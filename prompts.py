@@ -0,0 +1,179 @@
+import json
+import re
+
+# Prompt templates for each feature, keyed by the template id stored with saved searches.
+# Only the template id and the user-variable inputs are persisted; the full prompt is
+# rebuilt with render_prompt when needed.
+TEMPLATES = {
+    "nutrigenie": """
+            You are a certified nutritionist. A user has the following health problem: {user_query}.
+            Provide detailed recommendations, including:
+            1. Foods to eat.
+            2. Foods to avoid.
+            3. Lifestyle and exercise tips.
+            """,
+    "calorie": """
+                You are an expert nutritionist. Analyze the image to identify the food items 
+                and calculate the total calories. Provide the result in the following format:
+                Calories
+                1. Item 1 - no. of calories
+                2. Item 2 - no. of calories
+                ----
+
+                Protein
+                1.Item 1 - no. of protein
+                2.Item 2 - no. of protein
+                ----
+
+                Carbs
+                1.Item 1 - no. of carbs
+                2.Item 2 - no. of carbs
+                ----
+
+                Fats
+                1.Item 1 - no. of fats
+                2.Item 2 - no. of fats
+                ----
+
+                1.Total Calories: XX
+                2.Total Protein: XX
+                3.Total Carbs: XX
+                4.Total Fats: XX
+                """,
+    "calorie_text": """
+                You are an expert nutritionist. Estimate the nutrition for this food: {food}.
+                Provide the result in the following format:
+                Calories
+                1. Item 1 - no. of calories
+                ----
+
+                Protein
+                1.Item 1 - no. of protein
+                ----
+
+                Carbs
+                1.Item 1 - no. of carbs
+                ----
+
+                Fats
+                1.Item 1 - no. of fats
+                ----
+
+                1.Total Calories: XX
+                2.Total Protein: XX
+                3.Total Carbs: XX
+                4.Total Fats: XX
+                """,
+    "metabotrack": """
+                You are a highly advanced AI metabolism tracker.
+                A user wants to optimize their metabolism and improve health.
+                Analyze the user's data and provide personalized suggestions.
+
+                User Information:
+                - Activity Level: {activity_level}
+                - Sleep Duration: {sleep_hours} hours
+                - Last Meal Time: {last_meal_time}
+
+                Your Analysis Should Include:
+                1. Metabolism Score (0-100) based on their inputs.
+                2. Identify if the user is in Fat Storage Mode, Balanced Metabolism, or Fat Burning Mode.
+                3. Best time for the user to eat, exercise, and rest for optimal metabolism.
+                4. Personalized advice to improve metabolic health.
+                """,
+    "metabotrack_advice": """
+                You are a highly advanced AI metabolism tracker.
+                A user wants to optimize their metabolism and improve health.
+                Their metabolism has already been scored; do not re-score it.
+
+                User Information:
+                - Activity Level: {activity_level}
+                - Sleep Duration: {sleep_hours} hours
+                - Hours Since Last Meal: {hours_since_meal}
+                - Metabolism Score: {score}/100
+                - Current State: {fasting_state}
+
+                Your Analysis Should Include:
+                1. Best time for the user to eat, exercise, and rest for optimal metabolism.
+                2. Personalized advice to improve metabolic health.
+                """,
+    "recipemaster": """
+            You are a master chef and nutritionist. Based on the following inputs:
+            - Dietary Preference: {dietary_preferences}
+            - Health Goal: {health_goal}
+            - Ingredients: {ingredients}
+
+            Suggest 3 healthy and delicious recipes. For each recipe, include:
+            1. Recipe name
+            2. Brief description
+            3. Ingredients list
+            4. Step-by-step cooking instructions
+            5. Nutritional information (calories, protein, carbs, fats)
+            """,
+    "smartshopper": """
+            You are a kitchen assistant. Based on the following inputs:
+            - Planned Recipes: {planned_recipes}
+            - Ingredients at Home: {available_ingredients}
+
+            Create a smart shopping list by identifying the missing ingredients needed to make the planned recipes.
+            Categorize the ingredients into sections (e.g., Vegetables, Spices, Dairy, etc.) for easy shopping.
+            """,
+    "recipe_ingredients": """
+            You are a kitchen assistant. List the ingredients needed for each of these recipes: {recipes}.
+            Reply with exactly one line per recipe in this format:
+            Recipe name: ingredient 1, ingredient 2, ingredient 3
+            Use plain ingredient names without quantities, brands or preparation notes.
+            """,
+}
+
+# Short label stored as the search "query" and shown as the sidebar title
+TITLES = {
+    "nutrigenie": "{user_query}",
+    "metabotrack": "{activity_level}, {sleep_hours}h sleep",
+    "metabotrack_advice": "{activity_level}, {sleep_hours}h sleep",
+    "recipemaster": "{dietary_preferences}: {ingredients}",
+    "smartshopper": "{planned_recipes}",
+}
+
+# Template id used by each saved feature
+FEATURE_TEMPLATES = {
+    "Nutrigenie": "nutrigenie",
+    "MetaboTrack": "metabotrack",
+    "RecipeMaster": "recipemaster",
+    "SmartShopper": "smartshopper",
+}
+
+
+def render_prompt(template_id, **inputs):
+    return TEMPLATES[template_id].format(**inputs)
+
+
+def prompt_title(template_id, inputs):
+    return TITLES.get(template_id, "").format(**inputs).strip()
+
+
+def encode_inputs(inputs):
+    return json.dumps(inputs, separators=(",", ":"), ensure_ascii=False)
+
+
+def decode_inputs(value):
+    return json.loads(value) if value else {}
+
+
+_patterns = {}
+
+
+def _literal_pattern(text):
+    # Any run of whitespace matches any other, so re-indented prompts still parse
+    return "".join(r"\s+" if chunk.isspace() else re.escape(chunk)
+                   for chunk in re.split(r"(\s+)", text) if chunk)
+
+
+def parse_prompt(template_id, prompt):
+    """Recovers the inputs from a fully rendered prompt, or None if it doesn't match."""
+    if template_id not in _patterns:
+        parts = re.split(r"\{(\w+)\}", TEMPLATES[template_id].strip())
+        regex = "".join(f"(?P<{part}>.*?)" if i % 2 else _literal_pattern(part)
+                        for i, part in enumerate(parts))
+        _patterns[template_id] = re.compile(regex, re.DOTALL)
+    match = _patterns[template_id].fullmatch(prompt.strip())
+    return {key: value.strip() for key, value in match.groupdict().items()} if match else None
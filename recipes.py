@@ -0,0 +1,241 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+from database import get_connection
+from gemini import get_gemini_response, is_failure
+from prompts import render_prompt
+from shopping import parse_list
+
+# Result store settings (override through environment variables)
+RECIPE_TTL_SECONDS = int(os.getenv("NUTRIGENIE_RECIPE_TTL", 7 * 24 * 60 * 60))
+RECIPE_MAX_ENTRIES = int(os.getenv("NUTRIGENIE_RECIPE_MAX_ENTRIES", 2000))
+SUBSET_MIN_COVERAGE = float(os.getenv("NUTRIGENIE_RECIPE_COVERAGE", 0.75))  # share of the user's ingredients used
+SUPERSET_MAX_EXTRA = int(os.getenv("NUTRIGENIE_RECIPE_MAX_EXTRA", 1))        # ingredients the user would have to buy
+
+# Idle pre-warm settings: 0 seconds disables the background thread
+PREWARM_IDLE_SECONDS = int(os.getenv("NUTRIGENIE_PREWARM_IDLE", 300))
+PREWARM_TOP = int(os.getenv("NUTRIGENIE_PREWARM_TOP", 5))
+PREWARM_USER = "recipe-prewarm"   # the scheduler queue pre-warm calls are admitted under
+
+
+class RecipeRequest(namedtuple("RecipeRequest", ["dietary_preference", "health_goal", "ingredients"])):
+    """Canonical RecipeMaster request: the same wishes always produce the same key."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_inputs(cls, dietary_preference, health_goal, ingredients):
+        return cls(dietary_preference.strip(), health_goal.strip(), frozenset(parse_list(ingredients)))
+
+    @property
+    def ingredient_text(self):
+        return ", ".join(sorted(self.ingredients))
+
+    @property
+    def key(self):
+        return hashlib.sha256(
+            f"{self.dietary_preference}\n{self.health_goal}\n{self.ingredient_text}".encode()
+        ).hexdigest()
+
+    def prompt_inputs(self):
+        return {
+            "dietary_preferences": self.dietary_preference,
+            "health_goal": self.health_goal,
+            "ingredients": self.ingredient_text,
+        }
+
+
+# How a stored result answered a request: "exact", "subset" (the stored recipes use only
+# ingredients the user has) or "superset" (they need `missing` on top)
+RecipeMatch = namedtuple("RecipeMatch", ["response", "kind", "missing"])
+
+
+class RecipeStore:
+    """Persisted RecipeMaster answers keyed by canonical request.
+
+    Requests are grouped in memory by (preference, goal) so subset/superset matches
+    are a set comparison over a handful of stored ingredient sets. Every lookup is
+    also counted per request, which is what idle pre-warming ranks on. The tables
+    live in users.db (migration 10).
+    """
+
+    def __init__(self, ttl=RECIPE_TTL_SECONDS, max_entries=RECIPE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._groups = None  # {(preference, goal): {key: frozenset(ingredients)}}
+        self._stats = {"exact": 0, "subset": 0, "superset": 0, "misses": 0, "prewarmed": 0, "evictions": 0}
+        self._last_activity = time.time()
+        self._prewarm_thread = None
+
+    def _load(self):
+        # Called with the lock held: reads the stored ingredient sets once per process
+        if self._groups is None:
+            with get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT key, preference, goal, ingredients FROM recipe_results WHERE created_at >= ?",
+                    (time.time() - self.ttl,)).fetchall()
+            self._groups = {}
+            for key, preference, goal, ingredients in rows:
+                self._groups.setdefault((preference, goal), {})[key] = frozenset(ingredients.split(", "))
+
+    def _closest(self, request):
+        """Best stored answer for the request's preference and goal, as (key, kind, missing)."""
+        group = self._groups.get((request.dietary_preference, request.health_goal), {})
+        if request.key in group:
+            return request.key, "exact", []
+        wanted = request.ingredients
+        best = None
+        for key, stored in group.items():
+            if stored <= wanted:
+                if len(stored) < SUBSET_MIN_COVERAGE * len(wanted):
+                    continue
+                candidate = (len(stored) / len(wanted), key, "subset", [])
+            elif stored >= wanted:
+                extra = stored - wanted
+                if len(extra) > SUPERSET_MAX_EXTRA:
+                    continue
+                candidate = (len(wanted) / len(stored), key, "superset", sorted(extra))
+            else:
+                continue
+            if best is None or candidate[0] > best[0]:
+                best = candidate
+        return best[1:] if best else (None, None, None)
+
+    def _count_request(self, conn, request, now):
+        conn.execute(
+            "INSERT INTO recipe_requests (key, preference, goal, ingredients, count, last_seen) "
+            "VALUES (?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen",
+            (request.key, request.dietary_preference, request.health_goal, request.ingredient_text, now))
+
+    def lookup(self, request):
+        """Returns a RecipeMatch from stored answers, or None when Gemini has to be asked."""
+        if not request.ingredients:
+            return None
+        now = time.time()
+        with self._lock:
+            self._last_activity = now
+            self._load()
+            with get_connection() as conn:
+                self._count_request(conn, request, now)
+                key, kind, missing = self._closest(request)
+                row = None
+                if key is not None:
+                    row = conn.execute("SELECT response, created_at FROM recipe_results WHERE key=?", (key,)).fetchone()
+                    if row is None or now - row[1] > self.ttl:
+                        self._forget(conn, key)
+                        row = None
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None
+                conn.execute("UPDATE recipe_results SET last_used=? WHERE key=?", (now, key))
+                self._stats[kind] += 1
+        return RecipeMatch(row[0], kind, missing)
+
+    def add(self, request, response):
+        if not request.ingredients or is_failure(response):
+            return
+        now = time.time()
+        with self._lock:
+            self._load()
+            with get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO recipe_results "
+                    "(key, preference, goal, ingredients, response, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (request.key, request.dietary_preference, request.health_goal, request.ingredient_text,
+                     response, now, now))
+                self._groups.setdefault((request.dietary_preference, request.health_goal), {})[request.key] = \
+                    request.ingredients
+                count = conn.execute("SELECT COUNT(*) FROM recipe_results").fetchone()[0]
+                if count > self.max_entries:
+                    stale = conn.execute("SELECT key FROM recipe_results ORDER BY last_used ASC LIMIT ?",
+                                         (count - self.max_entries,)).fetchall()
+                    for (key,) in stale:
+                        self._forget(conn, key)
+                    self._stats["evictions"] += len(stale)
+
+    def _forget(self, conn, key):
+        conn.execute("DELETE FROM recipe_results WHERE key=?", (key,))
+        for group in self._groups.values():
+            group.pop(key, None)
+
+    # Idle pre-warm
+    def popular_requests(self, limit=PREWARM_TOP):
+        """Most requested ingredient set of each of the most popular preference/goal pairs."""
+        with get_connection() as conn:
+            rows = conn.execute("""
+            SELECT preference, goal, ingredients FROM (
+                SELECT preference, goal, ingredients, count,
+                       SUM(count) OVER (PARTITION BY preference, goal) AS combo_count,
+                       ROW_NUMBER() OVER (PARTITION BY preference, goal ORDER BY count DESC, last_seen DESC) AS rank
+                FROM recipe_requests
+            )
+            WHERE rank = 1
+            ORDER BY combo_count DESC
+            LIMIT ?
+            """, (limit,)).fetchall()
+        return [RecipeRequest(preference, goal, frozenset(ingredients.split(", "))) for preference, goal, ingredients in rows]
+
+    def prewarm_once(self, scheduler=None):
+        """Generates the first popular request without a fresh stored answer; True if one was made.
+
+        With a `scheduler` the call only happens when it can admit one right away, and
+        is charged to its token buckets like any user request.
+        """
+        for request in self.popular_requests():
+            with self._lock:
+                self._load()
+                key, _, _ = self._closest(request)
+            if key is not None:
+                continue
+            model = None
+            if scheduler is not None:
+                model = scheduler.admit(PREWARM_USER, timeout=0)
+                if model is None:
+                    return False  # no spare quota: users come first
+            print(f"[Recipe Prewarm] - {request.dietary_preference} / {request.health_goal}")
+            result = get_gemini_response(render_prompt("recipemaster", **request.prompt_inputs()),
+                                         first_model=model, rate_limiter=scheduler)
+            if is_failure(result["response"]):
+                return False
+            self.add(request, result["response"])
+            self._stats["prewarmed"] += 1
+            return True
+        return False
+
+    def _prewarm_loop(self, idle_seconds, scheduler):
+        while True:
+            time.sleep(idle_seconds)
+            if time.time() - self._last_activity < idle_seconds:
+                continue
+            try:
+                self.prewarm_once(scheduler)
+            except Exception as e:
+                print(f"[Recipe Prewarm Error] - {e}")
+
+    def start_prewarm(self, idle_seconds=PREWARM_IDLE_SECONDS, scheduler=None):
+        """Starts the background pre-warm thread once per process; `scheduler` meters its calls."""
+        with self._lock:
+            if idle_seconds <= 0 or self._prewarm_thread is not None:
+                return
+            self._prewarm_thread = threading.Thread(
+                target=self._prewarm_loop, args=(idle_seconds, scheduler), name="recipe-prewarm", daemon=True)
+            self._prewarm_thread.start()
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            result = dict(self._stats, entries=sum(len(group) for group in self._groups.values()))
+        hits = result["exact"] + result["subset"] + result["superset"]
+        lookups = hits + result["misses"]
+        result["hit_rate"] = hits / lookups if lookups else 0.0
+        return result
+
+
+# Process-wide store shared by every session
+recipe_store = RecipeStore()
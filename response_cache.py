@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Cache settings (override through environment variables)
+CACHE_DB_PATH = os.getenv("NUTRIGENIE_CACHE_DB", "response_cache.db")
+CACHE_TTL_SECONDS = int(os.getenv("NUTRIGENIE_CACHE_TTL", 24 * 60 * 60))
+CACHE_MAX_ENTRIES = int(os.getenv("NUTRIGENIE_CACHE_MAX_ENTRIES", 5000))
+
+_lock = threading.Lock()
+_conn = None
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+
+def _get_conn():
+    """Opens the cache database once per process and creates its table."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            model_used TEXT,
+            response TEXT,
+            created_at REAL,
+            last_access REAL
+        )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache(last_access)")
+        _conn.commit()
+    return _conn
+
+
+# Build Cache Key
+def normalize_prompt(prompt):
+    """Collapses whitespace and casing so re-indented prompts share a key."""
+    return " ".join(prompt.split()).lower()
+
+
+def make_key(prompt, image_data=None):
+    digest = hashlib.sha256(normalize_prompt(prompt).encode())
+    for part in image_data or []:
+        digest.update(b"\0" + part.get("mime_type", "").encode() + b"\0")
+        digest.update(hashlib.sha256(part["data"]).digest())
+    return digest.hexdigest()
+
+
+# Lookup
+def get(key):
+    """Returns a cached {"model_used", "response"} dict, or None on a miss."""
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute(
+            "SELECT model_used, response, created_at FROM response_cache WHERE key=?", (key,)
+        ).fetchone()
+        if row is None or now - row[2] > CACHE_TTL_SECONDS:
+            if row is not None:
+                conn.execute("DELETE FROM response_cache WHERE key=?", (key,))
+                conn.commit()
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE response_cache SET last_access=? WHERE key=?", (now, key))
+        conn.commit()
+        _stats["hits"] += 1
+    return {"model_used": row[0], "response": row[1]}
+
+
+# Store
+def put(key, model_used, response):
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, model_used, response, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, model_used, response, now, now),
+        )
+        _stats["writes"] += 1
+        _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn, now):
+    """Drops expired rows, then the least recently used ones above the size cap."""
+    removed = conn.execute(
+        "DELETE FROM response_cache WHERE created_at < ?", (now - CACHE_TTL_SECONDS,)
+    ).rowcount
+    count = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+    if count > CACHE_MAX_ENTRIES:
+        removed += conn.execute(
+            "DELETE FROM response_cache WHERE key IN "
+            "(SELECT key FROM response_cache ORDER BY last_access ASC LIMIT ?)",
+            (count - CACHE_MAX_ENTRIES,),
+        ).rowcount
+    _stats["evictions"] += removed
+
+
+def clear():
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM response_cache")
+        conn.commit()
+
+
+def stats():
+    """Hit/miss counters for this process plus the current entry count."""
+    with _lock:
+        entries = _get_conn().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        result = dict(_stats, entries=entries)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    return result
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import deque
+
+from gemini import GEMINI_MODELS, registry
+
+# Requests per minute each model may receive from this process (our quota)
+MODEL_RPM = {
+    "models/gemini-2.0-flash": int(os.getenv("NUTRIGENIE_RPM_FLASH", 15)),
+    "models/gemini-2.0-flash-lite": int(os.getenv("NUTRIGENIE_RPM_FLASH_LITE", 30)),
+    "models/gemini-1.5-pro": int(os.getenv("NUTRIGENIE_RPM_PRO", 2)),
+    "models/gemini-1.5-flash": int(os.getenv("NUTRIGENIE_RPM_15_FLASH", 15)),
+}
+
+# Cheapest first: where requests go once the preferred model's bucket is empty
+OVERFLOW_ORDER = [
+    "models/gemini-2.0-flash-lite",
+    "models/gemini-1.5-flash",
+    "models/gemini-2.0-flash",
+    "models/gemini-1.5-pro",
+]
+
+BURST_SECONDS = int(os.getenv("NUTRIGENIE_BURST_SECONDS", 10))    # bucket size, in seconds of quota
+MAX_QUEUE_WAIT = int(os.getenv("NUTRIGENIE_MAX_QUEUE_WAIT", 120))  # give up after this many seconds
+
+
+class TokenBucket:
+    """Refills `rpm` tokens per minute, holding at most `capacity`."""
+
+    def __init__(self, rpm, capacity):
+        self.rate = rpm / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+    def try_take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate else float("inf")
+
+
+class Ticket:
+    """One queued Gemini request; `model` is set once the scheduler admits it."""
+
+    def __init__(self, user):
+        self.user = user
+        self.model = None
+        self.enqueued = time.monotonic()
+
+
+class Scheduler:
+    """Process-wide admission control for Gemini calls.
+
+    Every model has a token bucket sized to its quota. Requests wait in per-user
+    queues that are served round-robin, so one user's burst can't starve the others.
+    A request goes to the healthiest model when it has a token and otherwise to the
+    cheapest model that still has one, instead of failing down the whole chain.
+    """
+
+    def __init__(self, model_rpm=None, burst_seconds=BURST_SECONDS):
+        model_rpm = MODEL_RPM if model_rpm is None else model_rpm
+        self._buckets = {
+            name: TokenBucket(rpm, max(1, rpm * burst_seconds // 60))
+            for name, rpm in model_rpm.items() if rpm > 0
+        }
+        self._cond = threading.Condition()
+        self._queues = {}       # {user: deque of tickets}
+        self._turns = deque()   # users with waiting tickets, in round-robin order
+        self._stats = {"admitted": 0, "overflowed": 0, "fallbacks": 0, "timeouts": 0}
+
+    @property
+    def throughput(self):
+        """Requests per second the buckets sustain once the bursts are spent."""
+        return sum(bucket.rate for bucket in self._buckets.values())
+
+    def _pick_model(self, now):
+        tripped = registry.open_circuits()
+        ordered = [name for name in registry.ordered() if name in self._buckets]
+        # Tripped models are only used when nothing else is left
+        healthy = [name for name in ordered if name not in tripped] or ordered
+        if healthy and self._buckets[healthy[0]].try_take(now):
+            return healthy[0], False
+        for name in OVERFLOW_ORDER + GEMINI_MODELS:
+            if name in healthy and self._buckets[name].try_take(now):
+                return name, True
+        return None, False
+
+    def _dispatch(self):
+        """Admits queued tickets, fairly across users, while any bucket has a token."""
+        now = time.monotonic()
+        while self._turns:
+            model, overflowed = self._pick_model(now)
+            if model is None:
+                break
+            user = self._turns.popleft()
+            ticket = self._queues[user].popleft()
+            if self._queues[user]:
+                self._turns.append(user)
+            else:
+                del self._queues[user]
+            ticket.model = model
+            self._stats["admitted"] += 1
+            self._stats["overflowed"] += overflowed
+        self._cond.notify_all()
+
+    def _position(self, ticket):
+        """1-based place in the round-robin order: one turn per user per round."""
+        rounds = self._queues[ticket.user].index(ticket)  # own tickets ahead of this one
+        turn = self._turns.index(ticket.user)
+        ahead = rounds
+        for i, user in enumerate(self._turns):
+            if user != ticket.user:
+                # Users before us in this round get one more turn than those after us
+                ahead += min(len(self._queues[user]), rounds + (1 if i < turn else 0))
+        return ahead + 1
+
+    def _cancel(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+                self._turns.remove(ticket.user)
+
+    def try_acquire(self, name):
+        """Takes a token for a fallback call to `name` without queueing; False when it has none."""
+        if not self._buckets:
+            return True
+        with self._cond:
+            bucket = self._buckets.get(name)
+            if bucket is None or not bucket.try_take(time.monotonic()):
+                return False
+            self._stats["fallbacks"] += 1
+            return True
+
+    def admit(self, user, on_wait=None, timeout=MAX_QUEUE_WAIT):
+        """Blocks until a model has capacity for this user's request and returns its name.
+
+        `on_wait(position, eta_seconds)` is called while the request is queued. Returns
+        None when the request could not be admitted within `timeout` seconds.
+        """
+        if not self._buckets:
+            return registry.ordered()[0]  # no quotas configured: nothing to wait for
+        ticket = Ticket(user)
+        with self._cond:
+            if user not in self._queues:
+                self._queues[user] = deque()
+                self._turns.append(user)
+            self._queues[user].append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    self._dispatch()
+                    if ticket.model is not None:
+                        return ticket.model
+                    if time.monotonic() - ticket.enqueued > timeout:
+                        self._cancel(ticket)
+                        self._stats["timeouts"] += 1
+                        return None
+                    position = self._position(ticket)
+                    now = time.monotonic()
+                    next_token = min(bucket.seconds_until_token(now) for bucket in self._buckets.values())
+                    eta = next_token + (position - 1) / self.throughput if self.throughput else float("inf")
+                if on_wait:
+                    on_wait(position, eta)
+                with self._cond:
+                    if ticket.model is None:
+                        self._cond.wait(min(max(next_token, 0.05), 1.0))
+        finally:
+            with self._cond:
+                if ticket.model is None:
+                    self._cancel(ticket)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._cond:
+            return {
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "users_waiting": len(self._turns),
+                "tokens": {name: round(bucket.available(now), 2) for name, bucket in self._buckets.items()},
+                **self._stats,
+            }
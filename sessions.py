@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from database import create_session, delete_expired_sessions, delete_session, get_session
+
+# Session settings (override through environment variables)
+SESSION_TTL_SECONDS = int(os.getenv("NUTRIGENIE_SESSION_TTL", 7 * 24 * 60 * 60))
+SESSION_CACHE_SIZE = int(os.getenv("NUTRIGENIE_SESSION_CACHE", 10000))   # active sessions kept in memory
+SESSION_SECRET = os.getenv("NUTRIGENIE_SESSION_SECRET", "")
+
+if not SESSION_SECRET:
+    print("[Sessions] NUTRIGENIE_SESSION_SECRET is not set; logins won't survive a restart")
+    SESSION_SECRET = secrets.token_hex(32)
+
+
+class SessionStore:
+    """Server-side login sessions behind opaque signed cookie tokens.
+
+    A token is "<random id>.<HMAC of the id>". Forged or mangled tokens are
+    rejected before any lookup, the database stores only a hash of the id, and
+    recently used sessions are answered from an in-memory LRU.
+    """
+
+    def __init__(self, secret=SESSION_SECRET, ttl=SESSION_TTL_SECONDS, cache_size=SESSION_CACHE_SIZE):
+        self._secret = secret.encode()
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # {token: (user dict, expires_at)}
+        self._stats = {"hits": 0, "misses": 0, "rejected": 0}
+
+    def _sign(self, session_id):
+        return hmac.new(self._secret, session_id.encode(), hashlib.sha256).hexdigest()
+
+    def _session_id(self, token):
+        """The id inside a correctly signed token, else None."""
+        session_id, _, signature = (token or "").partition(".")
+        # Bytes, not str: compare_digest raises TypeError on non-ASCII str from a tampered cookie
+        if session_id and hmac.compare_digest(signature.encode(), self._sign(session_id).encode()):
+            return session_id
+        return None
+
+    @staticmethod
+    def _key(session_id):
+        return hashlib.sha256(session_id.encode()).hexdigest()
+
+    def _remember(self, token, user, expires_at):
+        # Called with the lock held
+        self._cache[token] = (user, expires_at)
+        self._cache.move_to_end(token)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def create(self, user_id, username):
+        """Starts a session and returns the token to put in the cookie."""
+        session_id = secrets.token_urlsafe(32)
+        token = f"{session_id}.{self._sign(session_id)}"
+        expires_at = time.time() + self.ttl
+        create_session(self._key(session_id), user_id, username, expires_at)
+        with self._lock:
+            self._remember(token, {"id": user_id, "username": username}, expires_at)
+        return token
+
+    def resolve(self, token):
+        """The {"id", "username"} a token belongs to, or None if it is invalid or expired."""
+        session_id = self._session_id(token)
+        if session_id is None:
+            if token:
+                self._stats["rejected"] += 1
+            return None
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached and cached[1] > now:
+                self._cache.move_to_end(token)
+                self._stats["hits"] += 1
+                return cached[0]
+            self._stats["misses"] += 1
+        row = get_session(self._key(session_id))
+        if row is None or row[2] <= now:
+            return None
+        user = {"id": row[0], "username": row[1]}
+        with self._lock:
+            self._remember(token, user, row[2])
+        return user
+
+    def revoke(self, token):
+        session_id = self._session_id(token)
+        if session_id is None:
+            return
+        with self._lock:
+            self._cache.pop(token, None)
+        delete_session(self._key(session_id))
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for token in [token for token, (_, expires_at) in self._cache.items() if expires_at <= now]:
+                del self._cache[token]
+        return delete_expired_sessions(now)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache))
+
+
+session_store = SessionStore()
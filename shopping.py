@@ -0,0 +1,242 @@
+import difflib
+import re
+
+from database import get_recipe_ingredients, save_recipe_ingredients
+from gemini import is_failure
+from prompts import render_prompt
+
+# Different names for the same ingredient, mapped to one canonical name
+SYNONYMS = {
+    "aubergine": "eggplant",
+    "brinjal": "eggplant",
+    "capsicum": "bell pepper",
+    "green pepper": "bell pepper",
+    "red pepper": "bell pepper",
+    "coriander leaf": "cilantro",
+    "coriander leaves": "cilantro",
+    "fresh coriander": "cilantro",
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "garbanzo bean": "chickpea",
+    "chana": "chickpea",
+    "courgette": "zucchini",
+    "curd": "yogurt",
+    "yoghurt": "yogurt",
+    "maida": "all-purpose flour",
+    "plain flour": "all-purpose flour",
+    "flour": "all-purpose flour",
+    "atta": "whole wheat flour",
+    "prawn": "shrimp",
+    "minced meat": "ground beef",
+    "mince": "ground beef",
+    "extra virgin olive oil": "olive oil",
+    "evoo": "olive oil",
+    "caster sugar": "sugar",
+    "granulated sugar": "sugar",
+    "rocket": "arugula",
+    "haldi": "turmeric",
+    "jeera": "cumin",
+    "cumin seed": "cumin",
+    "dhania": "cilantro",
+    "chilli": "chili",
+    "chilies": "chili",
+    "chillies": "chili",
+    "green chilli": "green chili",
+    "red chilli powder": "chili powder",
+    "tomatoe": "tomato",
+    "garlic clove": "garlic",
+}
+
+# Words that end in "s" but are not plurals
+_NOT_PLURAL = {"hummus", "couscous", "asparagus", "molasses", "swiss", "brussels", "citrus",
+               "lemongrass", "grass", "harissa", "oats"}
+# Plurals ending in "ves" whose singular ends in "f"
+_F_PLURALS = {"leaves": "leaf", "loaves": "loaf", "halves": "half"}
+
+# Aisle lookup for the most common ingredients
+AISLES = {
+    "Vegetables": {"tomato", "onion", "garlic", "ginger", "potato", "carrot", "bell pepper", "cucumber",
+                   "spinach", "lettuce", "broccoli", "cauliflower", "cabbage", "eggplant", "zucchini",
+                   "mushroom", "green onion", "red onion", "olive", "celery", "pea", "corn", "green bean", "kale", "arugula",
+                   "sweet potato", "green chili", "chili", "beetroot", "radish", "okra", "pumpkin"},
+    "Fruits": {"lemon", "lime", "apple", "banana", "orange", "mango", "avocado", "berry", "strawberry",
+               "blueberry", "grape", "pineapple", "coconut", "date", "raisin"},
+    "Herbs": {"cilantro", "parsley", "basil", "mint", "dill", "rosemary", "thyme", "oregano", "curry leaf",
+              "bay leaf", "sage"},
+    "Meat & Seafood": {"chicken", "chicken breast", "chicken thigh", "beef", "ground beef", "lamb", "pork",
+                       "bacon", "sausage", "shrimp", "salmon", "tuna", "fish", "cod", "turkey"},
+    "Dairy & Eggs": {"milk", "butter", "yogurt", "cream", "heavy cream", "sour cream", "cheese", "paneer",
+                     "feta cheese", "parmesan", "mozzarella", "cheddar cheese", "egg", "ghee", "cream cheese"},
+    "Grains & Bakery": {"rice", "basmati rice", "brown rice", "pasta", "spaghetti", "noodle", "bread", "quinoa",
+                        "oats", "all-purpose flour", "whole wheat flour", "tortilla", "couscous", "breadcrumb"},
+    "Legumes": {"chickpea", "lentil", "kidney bean", "black bean", "tofu", "hummus"},
+    "Spices": {"salt", "black pepper", "pepper", "cumin", "turmeric", "chili powder", "paprika",
+               "garam masala", "coriander powder", "cinnamon", "cardamom", "clove", "nutmeg",
+               "mustard seed", "curry powder", "chili flake", "saffron"},
+    "Oils & Condiments": {"olive oil", "vegetable oil", "oil", "coconut oil", "sesame oil", "vinegar", "soy sauce",
+                          "ketchup", "mayonnaise", "mustard", "honey", "sugar", "tomato paste",
+                          "tomato puree", "stock", "chicken stock", "vegetable stock", "hot sauce"},
+    "Nuts & Seeds": {"almond", "cashew", "walnut", "peanut", "peanut butter", "sesame seed", "chia seed",
+                     "pine nut", "sunflower seed"},
+}
+_AISLE_OF = {ingredient: aisle for aisle, names in AISLES.items() for ingredient in names}
+# Fallback when the name isn't listed: a telling last word decides the aisle
+_AISLE_KEYWORDS = {
+    "powder": "Spices", "seed": "Spices", "masala": "Spices",
+    "oil": "Oils & Condiments", "sauce": "Oils & Condiments", "paste": "Oils & Condiments",
+    "cheese": "Dairy & Eggs", "cream": "Dairy & Eggs",
+    "bean": "Legumes", "flour": "Grains & Bakery", "rice": "Grains & Bakery",
+    "leaf": "Herbs", "nut": "Nuts & Seeds", "fish": "Meat & Seafood",
+}
+
+# Never worth putting on a shopping list
+PANTRY_STAPLES = {"water", "ice"}
+
+_QUANTITY = re.compile(r"^\s*[\d/.\-½¼¾]+\s*(?:g|kg|ml|l|oz|lb|lbs|cups?|tbsp|tsp|teaspoons?|tablespoons?|"
+                       r"pinch|cloves?|pieces?|cans?|bunch(?:es)?)?\b\.?\s*(?:of\s+)?", re.IGNORECASE)
+
+
+def _singular(word):
+    if word in _NOT_PLURAL or len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word in _F_PLURALS:
+        return _F_PLURALS[word]
+    if word.endswith(("oes", "ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(name):
+    """Lowercases, drops quantities and notes, singularizes and applies synonyms."""
+    name = re.sub(r"\(.*?\)", " ", name.lower())
+    name = _QUANTITY.sub("", name)
+    name = name.split(" - ")[0].split(" for ")[0]
+    name = " ".join(re.sub(r"[^a-z\- ]+", " ", name).split())
+    if not name:
+        return ""
+    name = SYNONYMS.get(name, name)
+    words = name.split()
+    name = " ".join(words[:-1] + [_singular(words[-1])])
+    return SYNONYMS.get(name, name)
+
+
+def normalize_recipe(name):
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", name.lower()).split())
+
+
+def parse_list(text):
+    """Splits a comma/newline separated text area into normalized, de-duplicated names."""
+    items = (normalize_ingredient(part) for part in re.split(r"[,\n;]+", text))
+    return {item for item in items if item}
+
+
+def aisle_of(ingredient):
+    if ingredient in _AISLE_OF:
+        return _AISLE_OF[ingredient]
+    return _AISLE_KEYWORDS.get(ingredient.split()[-1], "Other")
+
+
+def _parse_recipe_lines(text, wanted):
+    """Maps 'Recipe: a, b, c' lines back onto the requested normalized recipe names."""
+    found = {}
+    for line in text.splitlines():
+        line = line.replace("*", "").strip().lstrip("-•0123456789. ")
+        if ":" not in line:
+            continue
+        title, ingredients = line.split(":", 1)
+        key = normalize_recipe(title)
+        if key not in wanted:
+            close = difflib.get_close_matches(key, wanted, n=1, cutoff=0.75)
+            if not close:
+                continue
+            key = close[0]
+        names = parse_list(ingredients)
+        if names:
+            found[key] = names
+    return found
+
+
+def _planned(planned_recipes):
+    """{normalized recipe: recipe as typed} for the planned recipes text area."""
+    recipes = {}
+    for part in re.split(r"[,\n;]+", planned_recipes):
+        if part.strip():
+            recipes.setdefault(normalize_recipe(part), part.strip())
+    return recipes
+
+
+def unseen_recipes(planned_recipes):
+    """Normalized planned recipes that are not in the recipe map yet, sorted."""
+    recipes = _planned(planned_recipes)
+    return sorted(set(recipes) - set(get_recipe_ingredients(recipes)))
+
+
+def recipe_ingredients_prompt(recipes):
+    """One Gemini prompt asking for the ingredients of every recipe in `recipes`."""
+    return render_prompt("recipe_ingredients", recipes=", ".join(recipes))
+
+
+def learn_recipes(recipes, response):
+    """Stores the ingredient lists a recipe_ingredients answer gives for `recipes`; returns them."""
+    if not response or is_failure(response):
+        return {}
+    learned = _parse_recipe_lines(response, list(recipes))
+    if learned:
+        save_recipe_ingredients(learned)
+    return learned
+
+
+class ShoppingList:
+    def __init__(self, recipes, missing, sources, unknown_recipes, learned_recipes):
+        self.recipes = recipes                  # planned recipes as the user typed them
+        self.missing = missing                  # {aisle: [ingredient]}
+        self.sources = sources                  # {ingredient: [recipe]}
+        self.unknown_recipes = unknown_recipes  # recipes we could not resolve
+        self.learned_recipes = learned_recipes  # recipes that needed a Gemini call
+
+    @property
+    def resolved(self):
+        """True when at least one planned recipe has a known ingredient list."""
+        return len(self.unknown_recipes) < len(self.recipes)
+
+    def to_markdown(self):
+        if not self.missing:
+            lines = ["✅ You already have everything you need!"]
+        else:
+            lines = []
+            for aisle in sorted(self.missing):
+                lines.append(f"**{aisle}**")
+                for ingredient in self.missing[aisle]:
+                    lines.append(f"- {ingredient} _({', '.join(self.sources[ingredient])})_")
+                lines.append("")
+        if self.unknown_recipes:
+            lines.append(f"⚠️ Couldn't find ingredients for: {', '.join(self.unknown_recipes)}")
+        return "\n".join(lines).strip()
+
+
+def build_shopping_list(planned_recipes, available_ingredients, learned=()):
+    """Missing ingredients for the planned recipes, grouped by aisle.
+
+    Recipes come from the stored recipe map only, so this never calls Gemini:
+    recipes never seen before are fetched first with recipe_ingredients_prompt()
+    (as a background job) and stored by learn_recipes(). `learned` names the
+    recipes that took such a call.
+    """
+    recipes = _planned(planned_recipes)
+    known = get_recipe_ingredients(recipes)
+
+    have = parse_list(available_ingredients) | PANTRY_STAPLES
+    sources = {}
+    for recipe, ingredients in known.items():
+        for ingredient in set(ingredients) - have:
+            sources.setdefault(ingredient, []).append(recipes[recipe])
+    missing = {}
+    for ingredient in sorted(sources):
+        missing.setdefault(aisle_of(ingredient), []).append(ingredient)
+    unknown = [recipes[recipe] for recipe in recipes if recipe not in known]
+    return ShoppingList(list(recipes.values()), missing, sources, unknown,
+                        [recipes[recipe] for recipe in learned if recipe in recipes])